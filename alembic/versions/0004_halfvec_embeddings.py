@@ -0,0 +1,29 @@
+"""Store code chunk embeddings as half-precision vectors
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # halfvec needs pgvector >= 0.7 on the server
+    op.execute(
+        "ALTER TABLE code_chunks ALTER COLUMN embedding TYPE halfvec(1536) "
+        "USING embedding::halfvec(1536)"
+    )
+
+
+def downgrade() -> None:
+    op.execute(
+        "ALTER TABLE code_chunks ALTER COLUMN embedding TYPE vector(1536) "
+        "USING embedding::vector(1536)"
+    )
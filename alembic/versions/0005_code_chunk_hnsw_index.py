@@ -0,0 +1,27 @@
+"""Add an HNSW index for code chunk embedding search
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-16
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Not partial: a partial index is only usable when the query repeats its predicate,
+    # and HNSW skips NULL embeddings anyway
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_code_chunks_embedding_hnsw "
+        "ON code_chunks USING hnsw (embedding halfvec_ip_ops)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_code_chunks_embedding_hnsw")
@@ -0,0 +1,39 @@
+"""Add an HNSW index over binary-quantized code chunk embeddings
+
+Only created when VECTOR_SEARCH_BINARY_RERANK is enabled: every embedding
+write maintains the index, and nothing else reads it. To enable the setting
+on a database already past this revision, create the index by hand:
+
+    CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_code_chunks_embedding_bit_hnsw
+    ON code_chunks USING hnsw ((binary_quantize(embedding)::bit(1536)) bit_hamming_ops);
+
+and drop it again (DROP INDEX ix_code_chunks_embedding_bit_hnsw) when turning
+the setting off.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-16
+"""
+from alembic import op
+from src.core.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if not settings.VECTOR_SEARCH_BINARY_RERANK:
+        return
+    # Expression index: the quantized vector is derived, so no stored column is needed
+    op.execute(
+        "CREATE INDEX IF NOT EXISTS ix_code_chunks_embedding_bit_hnsw "
+        "ON code_chunks USING hnsw ((binary_quantize(embedding)::bit(1536)) bit_hamming_ops)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_code_chunks_embedding_bit_hnsw")
@@ -20,6 +20,7 @@ from src.services.analysis_progress import AnalysisProgressService
 from src.services.analysis_runner import run_analysis_job
 from src.services.semantic_search import SemanticSearchService
 from src.services.export_service import build_markdown, build_pdf
+from src.services.storage import storage_service
 from src.database import AsyncSessionLocal
 
 logger = get_logger(__name__)
@@ -744,35 +745,50 @@ async def get_analysis_artifacts(
     )
     artifacts = result.scalars().all()
 
+    items = []
+    for a in artifacts:
+        fmt, content = await _resolve_artifact(a)
+        items.append({
+            "id": str(a.id),
+            "type": a.artifact_type,
+            "persona": a.persona,
+            "title": a.title,
+            "description": a.description,
+            "format": fmt,
+            "content": content
+        })
+
     return {
         "analysis_id": str(analysis_uuid),
-        "artifacts": [
-            {
-                "id": str(a.id),
-                "type": a.artifact_type,
-                "persona": a.persona,
-                "title": a.title,
-                "description": a.description,
-                "format": a.format,
-                "content": a.content
-            }
-            for a in artifacts
-        ]
+        "artifacts": items
     }
 
 
-def _artifact_dicts(artifacts) -> list:
+async def _resolve_artifact(a) -> tuple[str, str]:
+    """Return (format, content) for an artifact, loading stored markdown_ref content."""
+    if a.format == "markdown_ref":
+        try:
+            content = await asyncio.to_thread(storage_service.read_artifact, a.content)
+        except OSError:
+            logger.warning(f"Stored artifact missing: {a.content}")
+            content = ""
+        return "markdown", content
+    return a.format, a.content
+
+
+async def _artifact_dicts(artifacts) -> list:
     """Convert artifact ORM list to list of dicts for export."""
-    return [
-        {
+    items = []
+    for a in artifacts:
+        fmt, content = await _resolve_artifact(a)
+        items.append({
             "type": a.artifact_type,
             "persona": a.persona,
             "title": a.title,
-            "format": a.format,
-            "content": a.content or "",
-        }
-        for a in artifacts
-    ]
+            "format": fmt,
+            "content": content or "",
+        })
+    return items
 
 
 @router.get("/{analysis_id}/export/markdown")
@@ -803,7 +819,7 @@ async def export_analysis_markdown(
         select(AnalysisArtifact).where(AnalysisArtifact.analysis_id == analysis_uuid)
     )
     artifacts = result.scalars().all()
-    artifact_list = _artifact_dicts(artifacts)
+    artifact_list = await _artifact_dicts(artifacts)
     out = build_markdown(artifact_list, analysis_id)
     return {"content": out["content"], "filename": out["filename"]}
 
@@ -836,7 +852,7 @@ async def export_analysis_pdf(
         select(AnalysisArtifact).where(AnalysisArtifact.analysis_id == analysis_uuid)
     )
     artifacts = result.scalars().all()
-    artifact_list = _artifact_dicts(artifacts)
+    artifact_list = await _artifact_dicts(artifacts)
     try:
         pdf_bytes = build_pdf(artifact_list, analysis_id)
     except Exception as e:
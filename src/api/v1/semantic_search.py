@@ -1,8 +1,8 @@
 """Semantic search API endpoints"""
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import Dict, Any
-from pydantic import BaseModel
+from typing import Dict, Any, List
+from pydantic import BaseModel, Field
 
 from src.api.deps import get_db, get_current_user
 from src.models.user import User
@@ -26,6 +26,12 @@ class QuestionQuery(BaseModel):
     use_llm: bool = True
 
 
+class BulkQuestionQuery(BaseModel):
+    """Several independent Q&A questions answered in one request"""
+    questions: List[str] = Field(..., min_length=1, max_length=20)
+    use_llm: bool = True
+
+
 @router.post("/{project_id}/search")
 async def semantic_search(
     project_id: str,
@@ -124,3 +130,48 @@ async def ask_question(
         use_llm=question_query.use_llm,
     )
     return {**answer, "project_id": str(project.id)}
+
+
+@router.post("/{project_id}/ask/bulk")
+async def ask_questions_bulk(
+    project_id: str,
+    question_query: BulkQuestionQuery,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+) -> Dict[str, Any]:
+    """
+    Ask several natural language questions about the codebase at once.
+    
+    Questions are answered concurrently; answers are returned in question order.
+    
+    Args:
+        project_id: Project ID to query
+        question_query: Questions and parameters
+        current_user: Current authenticated user
+        db: Database session
+    
+    Returns:
+        One answer per question, each shaped like the /ask response
+    """
+    # Verify project ownership
+    result = await db.execute(
+        select(Project).where(
+            Project.id == project_id,
+            Project.owner_id == current_user.id
+        )
+    )
+    project = result.scalar_one_or_none()
+    
+    if not project:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Project not found or access denied"
+        )
+    
+    search_service = SemanticSearchService(db)
+    answers = await search_service.answer_questions_bulk(
+        project_id=str(project.id),
+        questions=question_query.questions,
+        use_llm=question_query.use_llm,
+    )
+    return {"answers": answers, "project_id": str(project.id)}
@@ -14,6 +14,11 @@ class Settings(BaseSettings):
     DB_USER: str = "postgres"
     DB_PASSWORD: str = "postgres"
     DB_NAME: str = "macad_db"
+    DB_QUERY_CACHE_SIZE: int = 1200  # Compiled SQL statements cached per engine
+    DB_PREPARED_STATEMENT_CACHE_SIZE: int = 256  # asyncpg prepared statements per connection
+    DB_POOL_SIZE: int = 5  # Persistent connections kept in the pool
+    DB_MAX_OVERFLOW: int = 10  # Extra connections opened under burst load
+    DB_POOL_RECYCLE_SECONDS: int = 1800  # Replace connections before server/proxy idle timeouts
     
     @property
     def DATABASE_URL(self) -> str:
@@ -40,6 +45,24 @@ class Settings(BaseSettings):
     # File Storage
     STORAGE_PATH: str = "./storage"
     MAX_ZIP_SIZE_MB: int = 100
+    # Decompress and CRC-check every member when validating uploads (extraction checks anyway)
+    VALIDATE_ZIP_CRC: bool = False
+    # Reuse parsed chunks for unchanged files (keyed by content hash) under STORAGE_PATH/cache/ast;
+    # pruned least-recently-used first after each preprocessing run; delete the directory to clear it
+    AST_CACHE_ENABLED: bool = False
+    AST_CACHE_MAX_MB: int = 512
+    # Reuse embeddings for identical chunk texts (keyed by text hash) under STORAGE_PATH/cache/embeddings;
+    # ~6KB per entry, pruned least-recently-used first after each preprocessing run; delete the directory to clear it
+    EMBEDDING_CACHE_ENABLED: bool = False
+    EMBEDDING_CACHE_MAX_MB: int = 1024
+    # HNSW candidate list size for semantic search (higher = better recall, slower)
+    VECTOR_SEARCH_EF_SEARCH: int = 100
+    # Shortlist by binary-quantized vectors, then re-rank exactly (for very large projects)
+    # Needs the opt-in ix_code_chunks_embedding_bit_hnsw index (alembic/versions/0006_code_chunk_bit_index.py)
+    VECTOR_SEARCH_BINARY_RERANK: bool = False
+    VECTOR_SEARCH_RERANK_CANDIDATES: int = 200
+    # Launch the PDF export browser at startup instead of on the first export
+    PDF_BROWSER_WARM: bool = False
     
     # GitHub (for future use)
     GITHUB_TOKEN: Optional[str] = None
@@ -47,6 +70,9 @@ class Settings(BaseSettings):
     # LLM (for future milestones)
     OPENAI_API_KEY: Optional[str] = None
     OPENAI_MODEL: str = "gpt-5.2"
+    # Embedding rate limits for the API key (requests / tokens per minute)
+    OPENAI_EMBEDDING_RPM: int = 3000
+    OPENAI_EMBEDDING_TPM: int = 1_000_000
     ANTHROPIC_API_KEY: Optional[str] = None
     
     # Langfuse (for future milestones)
@@ -79,3 +105,4 @@ settings = Settings()
 os.makedirs(settings.STORAGE_PATH, exist_ok=True)
 os.makedirs(os.path.join(settings.STORAGE_PATH, "projects"), exist_ok=True)
 os.makedirs(os.path.join(settings.STORAGE_PATH, "uploads"), exist_ok=True)
+os.makedirs(os.path.join(settings.STORAGE_PATH, "cache"), exist_ok=True)
@@ -0,0 +1,8 @@
+"""JSON helpers shared by services"""
+
+try:
+    from orjson import loads as json_loads
+except ImportError:  # orjson is optional; stdlib json is the fallback
+    from json import loads as json_loads
+
+__all__ = ["json_loads"]
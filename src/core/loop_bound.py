@@ -0,0 +1,30 @@
+"""Per-event-loop singletons for clients that hold async connections"""
+import asyncio
+from typing import Callable, Generic, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class LoopBound(Generic[T]):
+    """Lazily built value shared by everything running on one event loop.
+    
+    A new event loop (e.g. tests or a restarted app) gets a fresh value from
+    factory, since connections and locks cannot be shared across loops.
+    """
+    
+    def __init__(self, factory: Callable[[], T]):
+        self._factory = factory
+        self._value: Optional[T] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+    
+    def get(self) -> T:
+        """Return the value for the running event loop, building it on first use"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._value, self._loop = self._factory(), loop
+        return self._value
+    
+    @property
+    def current(self) -> Optional[T]:
+        """The most recently built value, if any (e.g. for cleanup at shutdown)"""
+        return self._value
@@ -1,4 +1,5 @@
 """FastAPI application entry point"""
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import JSONResponse
@@ -7,6 +8,9 @@ from src.core.exceptions import MacadException
 from src.core.logging_config import setup_logging
 from src.api.v1 import auth, projects, metadata, semantic_search, analysis, websocket_progress, admin
 from src.database import init_db, close_db
+from src.services.export_service import warm_pdf_browser, shutdown_pdf_browser
+from src.services.mcp_client import close_mcp_client
+from src.services.code_chunker import shutdown_parse_pool
 import uvicorn
 
 # Set up logging
@@ -66,6 +70,8 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}", exc_info=True)
         raise
+    if settings.PDF_BROWSER_WARM:
+        warm_pdf_browser()
 
 
 # Shutdown event
@@ -78,6 +84,10 @@ async def shutdown_event():
         logger.info("Database connections closed")
     except Exception as e:
         logger.error(f"Error closing database connections: {e}", exc_info=True)
+    # Blocks for up to 10s while Chromium closes, so keep it off the event loop
+    await asyncio.to_thread(shutdown_pdf_browser)
+    shutdown_parse_pool()
+    await close_mcp_client()
 
 
 # Root endpoint
@@ -103,5 +113,6 @@ if __name__ == "__main__":
         "src.main:app",
         host="0.0.0.0",
         port=8000,
-        reload=settings.DEBUG
+        reload=settings.DEBUG,
+        loop="auto",  # uvloop when installed (uvicorn[standard]), asyncio otherwise
     )
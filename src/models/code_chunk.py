@@ -1,7 +1,7 @@
 """Code chunk model for storing parsed code segments"""
-from sqlalchemy import Column, String, Text, Integer, ForeignKey, Boolean, JSON
+from sqlalchemy import Column, String, Text, Integer, ForeignKey, Boolean, JSON, Index
 from sqlalchemy.dialects.postgresql import UUID, JSONB
-from pgvector.sqlalchemy import Vector
+from pgvector.sqlalchemy import HALFVEC
 from sqlalchemy.orm import relationship
 import enum
 from src.models.base import BaseModel
@@ -23,6 +23,15 @@ class ChunkType(str, enum.Enum):
 class CodeChunk(BaseModel):
     """Code chunk model - stores parsed code segments with metadata"""
     __tablename__ = "code_chunks"
+    __table_args__ = (
+        # ANN index for <#> (negative inner product) searches; NULL embeddings are not indexed
+        Index(
+            "ix_code_chunks_embedding_hnsw",
+            "embedding",
+            postgresql_using="hnsw",
+            postgresql_ops={"embedding": "halfvec_ip_ops"},
+        ),
+    )
     
     project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id"), nullable=False, index=True)
     file_path = Column(String(500), nullable=False)  # Relative path in project
@@ -39,7 +48,7 @@ class CodeChunk(BaseModel):
     parent_chunk_id = Column(UUID(as_uuid=True), ForeignKey("code_chunks.id"), nullable=True)  # For nested chunks
     
     # Semantic search
-    embedding = Column(Vector(1536), nullable=True)  # Vector embedding (pgvector) - 1536 dimensions for text-embedding-3-small
+    embedding = Column(HALFVEC(1536), nullable=True)  # Half-precision embedding (pgvector halfvec) - 1536 dimensions for text-embedding-3-small
     embedding_model = Column(String(100), nullable=True)  # Model used for embedding
     
     # Additional metadata
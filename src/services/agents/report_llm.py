@@ -5,6 +5,7 @@ from uuid import UUID
 import json
 import re
 from src.core.config import settings
+from src.core.json_utils import json_loads as _json_loads
 from src.services.langfuse_client import log_generation
 from src.services.usage_tracker import record_llm_usage
 
@@ -212,14 +213,14 @@ async def _call_llm_json(
             usage=usage,
         )
         try:
-            return json.loads(content)
-        except json.JSONDecodeError:
+            return _json_loads(content)
+        except ValueError:
             # try to extract JSON object from the response
             match = re.search(r"\{.*\}", content, flags=re.S)
             if match:
                 try:
-                    return json.loads(match.group(0))
-                except json.JSONDecodeError:
+                    return _json_loads(match.group(0))
+                except ValueError:
                     return {}
         return {}
     except Exception:
@@ -4,7 +4,7 @@ import asyncio
 from uuid import UUID
 from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import select, update, func, cast, Numeric
 from src.models.analysis import Analysis, AnalysisLog, AnalysisStatus, AnalysisStage, AnalysisInteraction
 from src.database import AsyncSessionLocal
 from src.core.config import settings
@@ -74,11 +74,14 @@ class AnalysisProgressService:
         processed_chunks: int = None,
         total_chunks: int = None,
         tokens_used: int = None,
-        estimated_cost: float = None
+        estimated_cost: float = None,
+        status: AnalysisStatus = None
     ) -> None:
         """Update analysis progress"""
         values = {}
         
+        if status:
+            values['status'] = status
         if stage:
             values['current_stage'] = stage
         if processed_files is not None:
@@ -98,7 +101,10 @@ class AnalysisProgressService:
             # Use a dedicated session to avoid concurrent operations on the shared session
             async with AsyncSessionLocal() as session:
                 await session.execute(
-                    update(Analysis).where(Analysis.id == analysis_id).values(**values)
+                    update(Analysis)
+                    .where(Analysis.id == analysis_id)
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
                 )
                 await session.commit()
             try:
@@ -119,6 +125,39 @@ class AnalysisProgressService:
             except Exception:
                 pass
     
+    async def add_usage(self, analysis_id: UUID, tokens: int, cost: float) -> None:
+        """Atomically add token usage and cost to an analysis, then broadcast the new totals"""
+        async with AsyncSessionLocal() as session:
+            result = await session.execute(
+                update(Analysis)
+                .where(Analysis.id == analysis_id)
+                .values(
+                    total_tokens_used=func.coalesce(Analysis.total_tokens_used, 0) + tokens,
+                    estimated_cost=func.round(
+                        cast(func.coalesce(Analysis.estimated_cost, 0.0) + cost, Numeric), 6
+                    ),
+                )
+                .returning(Analysis.total_tokens_used, Analysis.estimated_cost)
+                .execution_options(synchronize_session=False)
+            )
+            totals = result.one_or_none()
+            await session.commit()
+        if totals is None:
+            return
+        try:
+            from src.api.v1.websocket_progress import broadcast_progress
+            await broadcast_progress(
+                analysis_id=analysis_id,
+                stage=None,
+                message="progress_update",
+                current_file=None,
+                tokens_used=totals[0],
+                estimated_cost=totals[1],
+                level="info"
+            )
+        except Exception:
+            pass
+    
     async def log_event(
         self,
         analysis_id: UUID,
@@ -1,5 +1,7 @@
 """Analysis runner that executes preprocessing and agent orchestration."""
 import asyncio
+import functools
+import hashlib
 import json
 from uuid import UUID
 from sqlalchemy import select
@@ -8,9 +10,25 @@ from src.database import AsyncSessionLocal
 from src.services.analysis_progress import AnalysisProgressService, PauseTimeoutError
 from src.services.analysis_orchestrator import AnalysisOrchestrator
 from src.services.code_chunker import CodeChunker
-from src.models.analysis import Analysis, AnalysisStage, AnalysisStatus, AnalysisArtifact
+from src.models.analysis import AnalysisStage, AnalysisStatus, AnalysisArtifact
 from src.models.project import Project, SourceType
 from src.services.project_service import ProjectService
+from src.services.storage import storage_service
+
+# Chunker event stage -> analysis stage (anything else is reported as REPO_SCAN)
+STAGE_MAP = {
+    "code_chunking": AnalysisStage.CODE_CHUNKING,
+    "embedding_generation": AnalysisStage.EMBEDDING_GENERATION,
+}
+
+# Markdown artifacts larger than this are written to storage and referenced by path
+ARTIFACT_INLINE_MAX_BYTES = 64 * 1024
+
+SUPPORTED_DIAGRAMS = frozenset({"architecture", "sequence", "flowchart", "entity_relationship"})
+
+# Rendered diagram specs keyed by a hash of (repo_summary, preferences); oldest entry evicted first
+_DIAGRAM_CACHE_SIZE = 64
+_diagram_cache: dict = {}
 
 
 async def _wait_if_paused(progress: AnalysisProgressService, analysis_id: UUID):
@@ -18,6 +36,24 @@ async def _wait_if_paused(progress: AnalysisProgressService, analysis_id: UUID):
     await progress.wait_if_paused(analysis_id)
 
 
+async def _markdown_artifact_content(
+    project_id: UUID,
+    analysis_id: UUID,
+    artifact_type: str,
+    content: str
+) -> tuple[str, str]:
+    """Return (content, format), spilling large markdown to storage as a markdown_ref."""
+    if len(content.encode("utf-8")) <= ARTIFACT_INLINE_MAX_BYTES:
+        return content, "markdown"
+    path = await asyncio.to_thread(
+        storage_service.save_artifact,
+        str(project_id),
+        f"{analysis_id}_{artifact_type}.md",
+        content
+    )
+    return path, "markdown_ref"
+
+
 async def run_analysis_job(analysis_id: UUID) -> None:
     """Run full analysis pipeline for the given analysis ID."""
     async with AsyncSessionLocal() as db:
@@ -27,6 +63,12 @@ async def run_analysis_job(analysis_id: UUID) -> None:
         if not analysis:
             return
 
+        # Snapshot the options once so later steps don't touch ORM attributes mid-flight
+        options = analysis.user_context or {}
+        analysis_depth = analysis.analysis_depth
+        verbosity_level = analysis.verbosity_level
+        target_personas = analysis.target_personas or {}
+
         skip_preprocessing = analysis.current_stage in {
             AnalysisStage.AGENT_ORCHESTRATION,
             AnalysisStage.DOCUMENTATION_GENERATION
@@ -46,50 +88,57 @@ async def run_analysis_job(analysis_id: UUID) -> None:
 
                 # Preprocessing stage
                 code_chunker = CodeChunker(db)
-                code_chunker.pause_checker = lambda: progress.wait_if_paused(analysis_id)
+                code_chunker.pause_checker = functools.partial(progress.wait_if_paused, analysis_id)
                 code_chunker.set_analysis_context(progress, analysis_id)
 
-                async def progress_callback(event: dict):
-                    event_type = event.get("type")
+                async def on_progress(event: dict):
                     stage = event.get("stage")
+                    file_index = event.get("file_index")
+                    total_files = event.get("total_files")
+                    current_file = event.get("current_file")
+                    await progress.update_progress(
+                        analysis_id=analysis_id,
+                        stage=STAGE_MAP.get(stage, AnalysisStage.REPO_SCAN),
+                        processed_files=file_index,
+                        total_files=total_files
+                    )
+                    await progress.log_event(
+                        analysis_id=analysis_id,
+                        level="info",
+                        message=f"{stage}: {current_file}",
+                        stage=stage,
+                        current_file=current_file,
+                        file_index=file_index,
+                        total_files=total_files,
+                        progress_percentage=event.get("percent")
+                    )
+
+                async def on_log(event: dict):
+                    await progress.log_event(
+                        analysis_id=analysis_id,
+                        level=event.get("level", "info"),
+                        message=event.get("message", ""),
+                        stage=event.get("stage")
+                    )
+
+                async def on_completed(event: dict):
+                    await progress.log_event(
+                        analysis_id=analysis_id,
+                        level="milestone",
+                        message="Preprocessing completed",
+                        stage="preprocessing"
+                    )
+
+                handlers = {
+                    "progress": on_progress,
+                    "log": on_log,
+                    "completed": on_completed,
+                }
 
-                    if event_type == "progress":
-                        if stage == "code_chunking":
-                            current_stage = AnalysisStage.CODE_CHUNKING
-                        elif stage == "embedding_generation":
-                            current_stage = AnalysisStage.EMBEDDING_GENERATION
-                        else:
-                            current_stage = AnalysisStage.REPO_SCAN
-                        await progress.update_progress(
-                            analysis_id=analysis_id,
-                            stage=current_stage,
-                            processed_files=event.get("file_index"),
-                            total_files=event.get("total_files")
-                        )
-                        await progress.log_event(
-                            analysis_id=analysis_id,
-                            level="info",
-                            message=f"{stage}: {event.get('current_file')}",
-                            stage=stage,
-                            current_file=event.get("current_file"),
-                            file_index=event.get("file_index"),
-                            total_files=event.get("total_files"),
-                            progress_percentage=event.get("percent")
-                        )
-                    elif event_type == "log":
-                        await progress.log_event(
-                            analysis_id=analysis_id,
-                            level=event.get("level", "info"),
-                            message=event.get("message", ""),
-                            stage=event.get("stage")
-                        )
-                    elif event_type == "completed":
-                        await progress.log_event(
-                            analysis_id=analysis_id,
-                            level="milestone",
-                            message="Preprocessing completed",
-                            stage="preprocessing"
-                        )
+                async def progress_callback(event: dict):
+                    handler = handlers.get(event.get("type"))
+                    if handler:
+                        await handler(event)
 
                 code_chunker.progress_callback = progress_callback
 
@@ -104,19 +153,15 @@ async def run_analysis_job(analysis_id: UUID) -> None:
 
                 await code_chunker.preprocess_project(str(project.id), extracted_path)
 
-                # Restart progress from 0 for agent phase so 100% only when entire job is done
+                # Restart progress from 0 for agent phase so 100% only when entire job is done;
+                # the status flip rides along in the same UPDATE/commit.
                 await progress.update_progress(
                     analysis_id=analysis_id,
                     stage=AnalysisStage.AGENT_ORCHESTRATION,
                     processed_files=0,
                     total_files=100,
+                    status=AnalysisStatus.ANALYZING,
                 )
-                await db.execute(
-                    Analysis.__table__.update()
-                    .where(Analysis.id == analysis_id)
-                    .values(status=AnalysisStatus.ANALYZING)
-                )
-                await db.commit()
             else:
                 await progress.log_event(
                     analysis_id=analysis_id,
@@ -132,7 +177,6 @@ async def run_analysis_job(analysis_id: UUID) -> None:
                 message="Starting LangGraph agent orchestration",
                 stage="agent_orchestration"
             )
-            options = analysis.user_context or {}
             instructions = options.get("instructions", []) or []
             if instructions:
                 latest = instructions[-1]
@@ -150,10 +194,10 @@ async def run_analysis_job(analysis_id: UUID) -> None:
                 final_state = await orchestrator.run({
                     "analysis_id": analysis_id,
                     "project_id": project.id,
-                    "analysis_depth": analysis.analysis_depth,
-                    "verbosity_level": analysis.verbosity_level,
-                    "target_personas": analysis.target_personas or {},
-                    "analysis_options": analysis.user_context or {}
+                    "analysis_depth": analysis_depth,
+                    "verbosity_level": verbosity_level,
+                    "target_personas": target_personas,
+                    "analysis_options": options
                 })
             finally:
                 await orchestrator.close()
@@ -173,12 +217,15 @@ async def run_analysis_job(analysis_id: UUID) -> None:
             # Persist artifacts (basic for M4)
             artifacts = []
             if final_state.get("sde_output"):
+                content, fmt = await _markdown_artifact_content(
+                    project.id, analysis_id, "sde_report", final_state["sde_output"]
+                )
                 artifacts.append(AnalysisArtifact(
                     analysis_id=analysis_id,
                     artifact_type="sde_report",
                     persona="sde",
-                    content=final_state["sde_output"],
-                    format="markdown",
+                    content=content,
+                    format=fmt,
                     title="SDE Summary"
                 ))
             if final_state.get("sde_structured"):
@@ -191,24 +238,29 @@ async def run_analysis_job(analysis_id: UUID) -> None:
                     title="SDE Summary (Structured)"
                 ))
             if final_state.get("pm_output"):
+                content, fmt = await _markdown_artifact_content(
+                    project.id, analysis_id, "pm_report", final_state["pm_output"]
+                )
                 artifacts.append(AnalysisArtifact(
                     analysis_id=analysis_id,
                     artifact_type="pm_report",
                     persona="pm",
-                    content=final_state["pm_output"],
-                    format="markdown",
+                    content=content,
+                    format=fmt,
                     title="PM Summary"
                 ))
             if final_state.get("web_findings"):
+                content, fmt = await _markdown_artifact_content(
+                    project.id, analysis_id, "web_findings", final_state["web_findings"]
+                )
                 artifacts.append(AnalysisArtifact(
                     analysis_id=analysis_id,
                     artifact_type="web_findings",
-                    content=final_state["web_findings"],
-                    format="markdown",
+                    content=content,
+                    format=fmt,
                     title="Web Research Findings"
                 ))
 
-            options = analysis.user_context or {}
             if options.get("enable_diagrams"):
                 prefs = options.get("diagram_preferences", [])
                 artifacts.append(AnalysisArtifact(
@@ -269,8 +321,36 @@ def _mermaid_safe(s: str, max_len: int = 40) -> str:
 
 def _build_diagram_artifacts(analysis_id: UUID, repo_summary: dict, preferences: list) -> list:
     """Build Mermaid diagram artifacts from repo summary (architecture, sequence, flowchart, ER)."""
-    prefs = preferences or ["architecture"]
-    artifacts = []
+    prefs = SUPPORTED_DIAGRAMS.intersection(preferences or ["architecture"])
+    if not prefs:
+        return []
+
+    # Resumed/retried analyses produce the same summary, so reuse the rendered diagrams
+    key = hashlib.sha256(
+        json.dumps([repo_summary, sorted(prefs)], sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    specs = _diagram_cache.get(key)
+    if specs is None:
+        specs = _render_diagrams(repo_summary, prefs)
+        if len(_diagram_cache) >= _DIAGRAM_CACHE_SIZE:
+            _diagram_cache.pop(next(iter(_diagram_cache)))
+        _diagram_cache[key] = specs
+
+    return [
+        AnalysisArtifact(
+            analysis_id=analysis_id,
+            artifact_type=artifact_type,
+            content=content,
+            format="mermaid",
+            title=title
+        )
+        for artifact_type, content, title in specs
+    ]
+
+
+def _render_diagrams(repo_summary: dict, prefs: frozenset) -> tuple:
+    """Render Mermaid sources as (artifact_type, content, title) tuples."""
+    specs = []
 
     repo_type = repo_summary.get("repository_type", "repo")
     framework = repo_summary.get("primary_framework") or "framework"
@@ -288,6 +368,12 @@ def _build_diagram_artifacts(analysis_id: UUID, repo_summary: dict, preferences:
     if not entry_names:
         entry_names = ["app entry"]
 
+    # Extract route fields once into parallel lists (only the first 30 routes are ever drawn)
+    sampled_routes = api_routes[:30]
+    route_methods = [(r.get("method") or "GET").upper() for r in sampled_routes]
+    route_paths = [(r.get("path") or "/").strip() for r in sampled_routes]
+    path_segments = sorted({p.partition("/")[2].split("/", 1)[0] or "api" for p in route_paths})
+
     if "architecture" in prefs:
         api_label = f"{repo_type} {framework} API"
         lines = [
@@ -299,7 +385,7 @@ def _build_diagram_artifacts(analysis_id: UUID, repo_summary: dict, preferences:
         lines.append(f"    API --> EP[Entrypoints: {_mermaid_safe(ep_label, 50)}]")
         # API routes count and sample
         if api_routes:
-            path_samples = sorted(set((r.get("path") or "").split("/")[1] or "api" for r in api_routes[:20]))[:4]
+            path_samples = path_segments[:4]
             routes_label = f"{len(api_routes)} routes" + (f" e.g. /{path_samples[0]}" if path_samples else "")
             lines.append(f"    API --> Routes[{_mermaid_safe(routes_label)}]")
         else:
@@ -313,20 +399,12 @@ def _build_diagram_artifacts(analysis_id: UUID, repo_summary: dict, preferences:
             cfg_label = ", ".join(_mermaid_safe(c.split("/")[-1].split("\\")[-1], 15) for c in config_files[:3])
             lines.append(f"    API -.-> Config[{_mermaid_safe(cfg_label, 40)}]")
         diagram = "\n".join(lines)
-        artifacts.append(AnalysisArtifact(
-            analysis_id=analysis_id,
-            artifact_type="diagram_architecture",
-            content=diagram,
-            format="mermaid",
-            title="Architecture Diagram"
-        ))
+        specs.append(("diagram_architecture", diagram, "Architecture Diagram"))
 
     if "sequence" in prefs:
         lines = ["sequenceDiagram", "    participant Client", "    participant API", "    participant DB"]
         if api_routes:
-            for r in api_routes[:5]:
-                method = (r.get("method") or "GET").upper()
-                path = (r.get("path") or "/").strip()
+            for method, path in zip(route_methods[:5], route_paths[:5]):
                 path_short = path if len(path) <= 32 else path[:29] + "..."
                 lines.append(f"    Client->>API: {method} {path_short}")
                 lines.append("    API->>DB: Query / Validate")
@@ -347,19 +425,12 @@ def _build_diagram_artifacts(analysis_id: UUID, repo_summary: dict, preferences:
                 "    API-->>Client: ListResponse",
             ])
         diagram = "\n".join(lines)
-        artifacts.append(AnalysisArtifact(
-            analysis_id=analysis_id,
-            artifact_type="diagram_sequence",
-            content=diagram,
-            format="mermaid",
-            title="Sequence Diagram"
-        ))
+        specs.append(("diagram_sequence", diagram, "Sequence Diagram"))
 
     if "flowchart" in prefs:
         # Request flow derived from route path segments when possible, else analysis pipeline
         if api_routes:
-            path_groups = sorted(set((r.get("path") or "/").strip().split("/")[1] or "api" for r in api_routes[:30]))
-            steps = path_groups[:6]
+            steps = path_segments[:6]
             lines_flow = ["flowchart TD", "    Start[Client] --> API[API]"]
             prev = "API"
             for i, seg in enumerate(steps):
@@ -378,26 +449,23 @@ def _build_diagram_artifacts(analysis_id: UUID, repo_summary: dict, preferences:
                 "    Embed --> Agents[Agent orchestration]\n"
                 "    Agents --> End[Done]\n"
             )
-        artifacts.append(AnalysisArtifact(
-            analysis_id=analysis_id,
-            artifact_type="diagram_flowchart",
-            content=diagram,
-            format="mermaid",
-            title="Request Flow" if api_routes else "Analysis Flowchart"
-        ))
+        specs.append(("diagram_flowchart", diagram, "Request Flow" if api_routes else "Analysis Flowchart"))
 
     if "entity_relationship" in prefs:
         # Use model_hints for entity names when present
         if model_hints:
             entities = [m.upper().replace(" ", "_")[:20] for m in model_hints[:8]]
+            # Join once; membership tests keep substring semantics (e.g. "UserResponse")
+            hints_text = " ".join(model_hints)
+            entities_text = " ".join(entities)
             lines_er = ["erDiagram"]
-            if "User" in " ".join(model_hints) or "USER" in " ".join(entities):
+            if "User" in hints_text or "USER" in entities_text:
                 lines_er.append("    USER ||--o{ PROJECT : owns")
-            if "Project" in " ".join(model_hints) or "PROJECT" in " ".join(entities):
+            if "Project" in hints_text or "PROJECT" in entities_text:
                 lines_er.append("    PROJECT ||--o{ ANALYSIS : has")
             lines_er.append("    PROJECT ||--o{ CODE_CHUNK : contains")
             lines_er.append("    ANALYSIS ||--o{ ANALYSIS_LOG : logs")
-            if "AnalysisArtifact" in " ".join(model_hints):
+            if "AnalysisArtifact" in hints_text:
                 lines_er.append("    ANALYSIS ||--o{ ANALYSIS_ARTIFACT : produces")
             diagram = "\n".join(lines_er)
         else:
@@ -408,12 +476,6 @@ def _build_diagram_artifacts(analysis_id: UUID, repo_summary: dict, preferences:
                 "    PROJECT ||--o{ CODE_CHUNK : contains\n"
                 "    ANALYSIS ||--o{ ANALYSIS_LOG : logs\n"
             )
-        artifacts.append(AnalysisArtifact(
-            analysis_id=analysis_id,
-            artifact_type="diagram_er",
-            content=diagram,
-            format="mermaid",
-            title="Entity Relationship Diagram"
-        ))
+        specs.append(("diagram_er", diagram, "Entity Relationship Diagram"))
 
-    return artifacts
+    return tuple(specs)
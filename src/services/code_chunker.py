@@ -1,12 +1,20 @@
 """Code chunking and embedding service for semantic search"""
 import os
 import asyncio
+from array import array
+import hashlib
+import multiprocessing
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Callable
+from typing import List, Dict, Any, Optional, Callable, Tuple
 from uuid import UUID
 import json
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import bindparam, select, update
 from src.core.logging_config import get_logger
 from src.models.code_chunk import CodeChunk as CodeChunkModel
 from src.models.repository_metadata import RepositoryMetadata, FileMetadata
@@ -17,15 +25,310 @@ from src.services.storage import storage_service
 from src.services.usage_tracker import record_embedding_usage
 from src.core.config import settings
 
+try:
+    from openai import AsyncOpenAI, RateLimitError
+except ImportError:  # Embeddings are skipped without the OpenAI library
+    AsyncOpenAI = None
+    RateLimitError = None
+
 logger = get_logger(__name__)
 
+# Built once so SQLAlchemy's compiled cache and asyncpg's prepared statements are reused
+_PROJECT_BY_ID = select(Project).where(Project.id == bindparam("project_id"))
+
+_parse_pool: Optional[ProcessPoolExecutor] = None
+_worker_parser: Optional[CodeParser] = None
+
+
+def _get_parse_pool() -> ProcessPoolExecutor:
+    """Process pool shared by all chunkers for CPU-bound file parsing.
+    
+    Workers are spawned rather than forked: the server process already runs
+    other threads, and forking it can deadlock on locks those threads hold.
+    """
+    global _parse_pool
+    if _parse_pool is None:
+        _parse_pool = ProcessPoolExecutor(
+            max_workers=os.cpu_count(),
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _parse_pool
+
+
+def _reset_parse_pool(pool: ProcessPoolExecutor) -> None:
+    """Discard a broken pool so the next _get_parse_pool() starts a fresh one"""
+    global _parse_pool
+    if _parse_pool is pool:
+        _parse_pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def shutdown_parse_pool() -> None:
+    """Stop the shared parse pool's workers (called on application shutdown)"""
+    global _parse_pool
+    pool, _parse_pool = _parse_pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+class _EmbeddingRateLimiter:
+    """Token bucket over requests and tokens per minute for embedding calls.
+    
+    pause_for() blocks every caller, e.g. for the Retry-After of a 429.
+    """
+    
+    def __init__(self, requests_per_minute: int, tokens_per_minute: int):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = float(requests_per_minute)
+        self._tokens = float(tokens_per_minute)
+        self._updated = time.monotonic()
+        self._pause_until = 0.0
+        self._lock = asyncio.Lock()
+    
+    def pause_for(self, seconds: float) -> None:
+        """Hold all callers for at least the given number of seconds"""
+        self._pause_until = max(self._pause_until, time.monotonic() + seconds)
+    
+    async def acquire(self, tokens: int) -> None:
+        """Wait until one request carrying the given number of tokens is allowed"""
+        tokens = min(tokens, self.tokens_per_minute)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._pause_until:
+                    await asyncio.sleep(self._pause_until - now)
+                    continue
+                
+                elapsed = now - self._updated
+                self._updated = now
+                self._requests = min(self.requests_per_minute, self._requests + elapsed * self.requests_per_minute / 60)
+                self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self.tokens_per_minute / 60)
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                
+                await asyncio.sleep(max(
+                    (1 - self._requests) * 60 / self.requests_per_minute,
+                    (tokens - self._tokens) * 60 / self.tokens_per_minute,
+                ))
+
+
+_embedding_limiter: Optional[_EmbeddingRateLimiter] = None
+
+
+def _get_embedding_limiter() -> _EmbeddingRateLimiter:
+    """Rate limiter shared by all chunkers, since OpenAI limits apply per API key."""
+    global _embedding_limiter
+    if _embedding_limiter is None:
+        _embedding_limiter = _EmbeddingRateLimiter(
+            settings.OPENAI_EMBEDDING_RPM, settings.OPENAI_EMBEDDING_TPM
+        )
+    return _embedding_limiter
+
+
+def _retry_after_seconds(error: Exception, default: float) -> float:
+    """Read the server's requested delay from a rate-limit error's response headers."""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return default
+
+
+# Bump when parser/splitter output changes so stale cache entries are ignored
+_PARSE_CACHE_VERSION = b"7"
+# Every parse cache file starts with this line; anything else is treated as a miss
+_PARSE_CACHE_HEADER = b"macad-ast " + _PARSE_CACHE_VERSION + b"\n"
+# The interpreter version is part of the key since ast.parse results differ across versions
+_PARSE_CACHE_KEY_PREFIX = _PARSE_CACHE_VERSION + f"-py{sys.version_info[0]}.{sys.version_info[1]}-".encode()
+
+
+def _encode_parse_result(result: Tuple[List[CodeChunk], List[CodeChunk], int]) -> bytes:
+    """Serialize a parse result as the cache header followed by JSON"""
+    raw_chunks, chunks, lines_of_code = result
+    payload = {
+        "raw": [chunk.to_dict() for chunk in raw_chunks],
+        "split": [chunk.to_dict() for chunk in chunks],
+        "lines": lines_of_code,
+    }
+    return _PARSE_CACHE_HEADER + json.dumps(payload, separators=(",", ":")).encode()
+
+
+def _decode_parse_result(data: bytes) -> Tuple[List[CodeChunk], List[CodeChunk], int]:
+    """Inverse of _encode_parse_result; raises ValueError for foreign or stale files"""
+    if not data.startswith(_PARSE_CACHE_HEADER):
+        raise ValueError("unrecognized parse cache header")
+    payload = json.loads(data[len(_PARSE_CACHE_HEADER):])
+    return (
+        [CodeChunk(**item) for item in payload["raw"]],
+        [CodeChunk(**item) for item in payload["split"]],
+        int(payload["lines"]),
+    )
+
+
+def _prune_cache_dir(cache_dir: str, max_bytes: int) -> int:
+    """Delete the least recently used files of a two-level cache directory until it fits max_bytes.
+    
+    Prunes down to 90% of the limit so the next run does not start at the edge; returns files removed.
+    """
+    entries = []
+    total = 0
+    try:
+        shards = [entry for entry in os.scandir(cache_dir) if entry.is_dir(follow_symlinks=False)]
+    except FileNotFoundError:
+        return 0
+    for shard in shards:
+        with os.scandir(shard.path) as files:
+            for entry in files:
+                try:
+                    stat = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                total += stat.st_size
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+    if total <= max_bytes:
+        return 0
+    
+    entries.sort()
+    target = max_bytes * 0.9
+    removed = 0
+    for _, size, path in entries:
+        if total <= target:
+            break
+        try:
+            os.unlink(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+def _prune_disk_caches() -> None:
+    """Keep the enabled on-disk caches within their configured sizes"""
+    caches = []
+    if settings.AST_CACHE_ENABLED:
+        caches.append(("ast", settings.AST_CACHE_MAX_MB))
+    if settings.EMBEDDING_CACHE_ENABLED:
+        caches.append(("embeddings", settings.EMBEDDING_CACHE_MAX_MB))
+    for name, max_mb in caches:
+        cache_dir = str(storage_service.cache_path / name)
+        try:
+            removed = _prune_cache_dir(cache_dir, max_mb << 20)
+        except OSError as e:
+            logger.warning(f"Could not prune {name} cache: {e}")
+            continue
+        if removed:
+            logger.info(f"Pruned {removed} least recently used entries from the {name} cache")
+
+
+def _parse_worker(
+    file_path: str,
+    language: str,
+    cache_dir: Optional[str] = None
+) -> Tuple[List[CodeChunk], List[CodeChunk], int, bool]:
+    """Parse, split and line-count one file inside a pool process.
+    
+    Returns (raw_chunks, split_chunks, lines_of_code, cache_hit) so the writer
+    needs a single round-trip per file. When cache_dir is set, results are
+    cached on disk by content hash and reused for unchanged files, skipping
+    ast.parse and chunk extraction entirely.
+    """
+    global _worker_parser
+    # Read the file once; hashing, parsing and line counting all use these bytes
+    try:
+        with open(file_path, "rb") as f:
+            raw = f.read()
+    except OSError as e:
+        logger.error(f"Error reading file {file_path}: {e}")
+        return [], [], 0, False
+    
+    cache_file = None
+    if cache_dir:
+        digest = hashlib.sha256(_PARSE_CACHE_KEY_PREFIX + language.encode() + b"\0" + raw).hexdigest()
+        cache_file = Path(cache_dir) / digest[:2] / digest
+        try:
+            with open(cache_file, "rb") as f:
+                cached = _decode_parse_result(f.read())
+            os.utime(cache_file)  # Mark as recently used for pruning
+            return (*cached, True)
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.debug(f"Parse cache miss for {file_path}: {e}")
+    
+    lines_of_code = CodeChunker._count_lines(raw)
+    content = CodeParser.decode_source(raw)
+    
+    if _worker_parser is None:
+        _worker_parser = CodeParser()
+    raw_chunks = _worker_parser.parse_content(content, file_path, language)
+    chunks = CodeChunker._split_large_chunks(raw_chunks)
+    result = (raw_chunks, chunks, lines_of_code)
+    
+    if cache_file is not None:
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            tmp_file = cache_file.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_file, "wb") as f:
+                f.write(_encode_parse_result(result))
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            logger.debug(f"Could not write parse cache for {file_path}: {e}")
+    return (*result, False)
+
+
+def _load_cached_embeddings(cache_dir: str, keys) -> Dict[str, array]:
+    """Read float32 embedding vectors cached on disk for the given text hashes."""
+    found: Dict[str, array] = {}
+    for key in keys:
+        cache_file = os.path.join(cache_dir, key[:2], key)
+        try:
+            with open(cache_file, "rb") as f:
+                vector = array("f")
+                vector.frombytes(f.read())
+            os.utime(cache_file)  # Mark as recently used for pruning
+        except (OSError, ValueError):
+            continue
+        found[key] = vector
+    return found
+
+
+def _store_cached_embeddings(cache_dir: str, vectors: Dict[str, array]) -> None:
+    """Write embedding vectors to the disk cache as raw float32 bytes."""
+    for key, vector in vectors.items():
+        cache_file = os.path.join(cache_dir, key[:2], key)
+        try:
+            os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+            tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+            with open(tmp_file, "wb") as f:
+                f.write(vector.tobytes())
+            os.replace(tmp_file, cache_file)
+        except OSError as e:
+            logger.debug(f"Could not write embedding cache entry {key}: {e}")
+
 
 class CodeChunker:
     """Handles code chunking and semantic preparation for vector embedding"""
-    EMBED_FILES_PER_WINDOW = 2
     EMBED_BATCH_SIZE = 20
-    EMBED_MAX_CHUNKS_PER_WINDOW = 80
+    EMBED_MAX_INFLIGHT = 5
+    PARSE_WORKERS = os.cpu_count() or 4
+    PARSE_QUEUE_SIZE = 32
+    EMBED_QUEUE_SIZE = 8
+    EMBED_MAX_BATCH_SIZE = 100  # EMBED_BATCH_SIZE * EMBED_MAX_INFLIGHT: one full round of requests
+    EMBED_MAX_LATENCY_MS = 250
+    EMBED_MAX_INPUT_CHARS = 16_000  # Under the model's 8191-token per-input limit at ~2 characters per token
+    EMBED_MEMO_SIZE = 4096  # Embedding vectors kept in memory per chunker
+    EMBEDDING_MODEL = "text-embedding-3-small"
+    EMBED_RATE_LIMIT_RETRIES = 3
     MAX_CHUNK_CHARS = 3000
+    TEST_FILE_PATTERN = re.compile(r"test_|_test\.|\.test\.|\.spec\.")
     
     def __init__(self, db: AsyncSession):
         self.db = db
@@ -36,6 +339,9 @@ class CodeChunker:
         self.embedding_failures = 0
         self._progress = None  # AnalysisProgressService when running under analysis
         self._analysis_id: Optional[UUID] = None
+        self._db_lock = asyncio.Lock()  # Serializes use of self.db across pipeline stages
+        self._embedding_memo: Dict[str, array] = {}  # Text hash -> float32 vector
+        self._openai_client = None  # Created lazily; only needed when embeddings run
     
     def set_analysis_context(self, progress: Any, analysis_id: UUID) -> None:
         """Set progress and analysis_id so embedding usage can be recorded."""
@@ -71,11 +377,12 @@ class CodeChunker:
             })
             raise RuntimeError("Embedding failed more than 2 batches; aborting analysis")
     
-    def _split_large_chunks(self, chunks: List[CodeChunk]) -> List[CodeChunk]:
+    @classmethod
+    def _split_large_chunks(cls, chunks: List[CodeChunk]) -> List[CodeChunk]:
         """Split oversized chunks by character length."""
         split_chunks: List[CodeChunk] = []
         for chunk in chunks:
-            if len(chunk.content) <= self.MAX_CHUNK_CHARS:
+            if len(chunk.content) <= cls.MAX_CHUNK_CHARS:
                 split_chunks.append(chunk)
                 continue
             
@@ -84,53 +391,42 @@ class CodeChunker:
                 split_chunks.append(chunk)
                 continue
             
+            # Cut at the last newline that keeps each part within budget
+            text = "\n".join(lines)
+            budget = cls.MAX_CHUNK_CHARS - 1
             part_index = 1
-            current_lines: List[str] = []
-            current_len = 0
-            start_offset = 0
-            
-            for idx, line in enumerate(lines):
-                line_len = len(line) + 1
-                if current_lines and current_len + line_len > self.MAX_CHUNK_CHARS:
-                    part_content = "\n".join(current_lines)
-                    part = CodeChunk(
-                        name=f"{chunk.name}__part{part_index}",
-                        chunk_type=chunk.chunk_type,
-                        content=part_content,
-                        start_line=chunk.start_line + start_offset,
-                        end_line=chunk.start_line + idx - 1,
-                        language=chunk.language,
-                        docstring=chunk.docstring if part_index == 1 else None,
-                        dependencies=chunk.dependencies,
-                        parameters=chunk.parameters,
-                        return_type=chunk.return_type,
-                        parent=chunk.parent
-                    )
-                    split_chunks.append(part)
-                    part_index += 1
-                    current_lines = []
-                    current_len = 0
-                    start_offset = idx
+            pos = 0
+            line_offset = 0
+            while True:
+                if len(text) - pos <= budget:
+                    end = len(text)
+                else:
+                    end = text.rfind("\n", pos, pos + budget + 1)
+                    if end == -1:
+                        # A single line over budget becomes its own part
+                        end = text.find("\n", pos)
+                        if end == -1:
+                            end = len(text)
                 
-                current_lines.append(line)
-                current_len += line_len
-            
-            if current_lines:
-                part_content = "\n".join(current_lines)
-                part = CodeChunk(
+                line_count = text.count("\n", pos, end) + 1
+                split_chunks.append(CodeChunk(
                     name=f"{chunk.name}__part{part_index}",
                     chunk_type=chunk.chunk_type,
-                    content=part_content,
-                    start_line=chunk.start_line + start_offset,
-                    end_line=chunk.start_line + len(lines) - 1,
+                    content=text[pos:end],
+                    start_line=chunk.start_line + line_offset,
+                    end_line=chunk.start_line + line_offset + line_count - 1,
                     language=chunk.language,
                     docstring=chunk.docstring if part_index == 1 else None,
                     dependencies=chunk.dependencies,
                     parameters=chunk.parameters,
                     return_type=chunk.return_type,
                     parent=chunk.parent
-                )
-                split_chunks.append(part)
+                ))
+                if end >= len(text):
+                    break
+                part_index += 1
+                line_offset += line_count
+                pos = end + 1
         
         return split_chunks
     
@@ -142,7 +438,7 @@ class CodeChunker:
         try:
             # Get project
             result = await self.db.execute(
-                select(Project).where(Project.id == project_id)
+                _PROJECT_BY_ID, {"project_id": project_id}
             )
             project = result.scalar_one_or_none()
             
@@ -169,7 +465,8 @@ class CodeChunker:
             })
             logger.debug("Step 1: Analyzing repository structure")
             self.analyzer = RepositoryAnalyzer(str(repo_path))
-            repo_metadata = self.analyzer.analyze()
+            # Repository scan walks and reads files; keep it off the event loop
+            repo_metadata = await asyncio.to_thread(self.analyzer.analyze)
             
             # Create repository metadata record
             repo_meta_record = RepositoryMetadata(
@@ -204,213 +501,30 @@ class CodeChunker:
             })
             logger.debug("Step 2: Processing files and extracting code chunks")
             
-            # Count total files first
-            total_files = 0
-            for root, dirs, files in os.walk(repo_path):
-                skip_patterns = self.analyzer.skip_patterns
-                dirs[:] = [d for d in dirs if d not in skip_patterns]
-                total_files += len([f for f in files if self.parser.detect_language(f)])
-            
-            total_chunks = 0
-            file_count = 0
-            window_files = 0
-            window_chunks: List[CodeChunkModel] = []
-            embedding_started = False
-            
-            for root, dirs, files in os.walk(repo_path):
-                # Filter skip directories
-                skip_patterns = self.analyzer.skip_patterns
-                dirs[:] = [d for d in dirs if d not in skip_patterns]
-                
-                for file in files:
-                    await self._maybe_pause()
-                    file_path = Path(root) / file
-                    relative_path = str(file_path.relative_to(repo_path))
-                    
-                    # Detect language
-                    language = self.parser.detect_language(file)
-                    if not language:
-                        continue
-                    
-                    file_count += 1
-                    progress_percent = min(int((file_count / max(total_files, 1)) * 100), 99)  # Cap at 99% until complete
-                    
-                    # Emit progress with file info
-                    await self._emit_progress({
-                        "type": "progress",
-                        "percent": progress_percent,
-                        "stage": "code_chunking",
-                        "current_file": relative_path,
-                        "file_index": file_count,
-                        "total_files": total_files
-                    })
-                    
-                    # Emit detailed log about file processing
-                    await self._emit_progress({
-                        "type": "log",
-                        "level": "info",
-                        "message": f"Processing: {relative_path} ({language})"
-                    })
-                    
-                    logger.debug(f"Processing file ({file_count}/{total_files}): {relative_path}")
-                    
-                    try:
-                        await self._maybe_pause()
-                        # Parse file and extract chunks
-                        raw_chunks = self.parser.parse_file(str(file_path), language)
-                        chunks = self._split_large_chunks(raw_chunks)
-                        
-                        if not chunks:
-                            continue
-                        
-                        # Emit log about chunks found
-                        await self._emit_progress({
-                            "type": "log",
-                            "level": "info",
-                            "message": f"✓ Extracted {len(chunks)} code chunks from {relative_path}"
-                        })
-                        
-                        # Check if file is important
-                        is_important = self._is_important_file(relative_path, repo_metadata)
-                        
-                        # Create file metadata record
-                        file_meta = FileMetadata(
-                            project_id=project_id,
-                            repository_id=repo_meta_record.id,
-                            file_path=relative_path,
-                            file_name=file,
-                            file_type=self._get_file_type(relative_path),
-                            language=language,
-                            lines_of_code=self._count_lines(str(file_path)),
-                            is_test_file=self._is_test_file(file),
-                            is_important=is_important,
-                            has_docstring=self._has_docstring(chunks),
-                            function_count=sum(1 for c in raw_chunks if c.chunk_type == "function"),
-                            class_count=sum(1 for c in raw_chunks if c.chunk_type == "class"),
-                            chunks_created=len(chunks),
-                            is_processed=True,
-                        )
-                        
-                        self.db.add(file_meta)
-                        await self.db.commit()
-                        
-                        # Create code chunk records
-                        for chunk in chunks:
-                            chunk_record = CodeChunkModel(
-                                project_id=project_id,
-                                file_path=relative_path,
-                                chunk_type=chunk.chunk_type,
-                                name=chunk.name,
-                                content=chunk.content,
-                                start_line=chunk.start_line,
-                                end_line=chunk.end_line,
-                                language=language,
-                                is_important=is_important,
-                                docstring=chunk.docstring,
-                                dependencies={"external": chunk.dependencies},
-                                parameters=chunk.parameters,
-                                return_type=chunk.return_type,
-                            )
-                            
-                            self.db.add(chunk_record)
-                            total_chunks += 1
-                            window_chunks.append(chunk_record)
-                        
-                        await self.db.commit()
-                        window_files += 1
-                        logger.debug(f"Extracted {len(chunks)} chunks from {relative_path}")
-                        
-                        if settings.OPENAI_API_KEY and window_chunks:
-                            if (window_files >= self.EMBED_FILES_PER_WINDOW or
-                                len(window_chunks) >= self.EMBED_MAX_CHUNKS_PER_WINDOW):
-                                await self._maybe_pause()
-                                if not embedding_started:
-                                    embedding_started = True
-                                    await self._emit_progress({
-                                        "type": "progress",
-                                        "stage": "embedding_generation",
-                                        "file_index": file_count,
-                                        "total_files": total_files
-                                    })
-                                    await self._emit_progress({
-                                        "type": "log",
-                                        "level": "info",
-                                        "message": "🔄 Starting embeddings generation"
-                                    })
-                                
-                                try:
-                                    embedding_count = await asyncio.wait_for(
-                                        self._generate_embeddings(
-                                            window_chunks,
-                                            batch_size=self.EMBED_BATCH_SIZE
-                                        ),
-                                        timeout=120.0
-                                    )
-                                except asyncio.TimeoutError:
-                                    await self._register_embedding_failure(
-                                        "⚠️ Embedding generation timed out; skipping this window."
-                                    )
-                                    embedding_count = 0
-                                await self._emit_progress({
-                                    "type": "log",
-                                    "level": "info",
-                                    "message": f"✓ Embedded window - {embedding_count} embeddings created"
-                                })
-                                window_chunks = []
-                                window_files = 0
-                    
-                    except Exception as e:
-                        logger.warning(f"Error processing {relative_path}: {e}")
-                        continue
+            # Enumerate source files in a single pass (in a thread); the list also gives the total
+            source_files = await asyncio.to_thread(lambda: list(self._iter_source_files(str(repo_path))))
+            total_files = len(source_files)
+            
+            pipeline = await self._run_chunking_pipeline(
+                project_id, source_files, repo_meta_record.id, repo_metadata
+            )
+            file_count = pipeline["file_count"]
+            total_chunks = pipeline["total_chunks"]
+            embedding_started = pipeline["embedding_started"]
             
             # Commit all code chunks
             await self.db.commit()
             
             logger.debug(f"Preprocessing complete: {file_count} files, {total_chunks} chunks")
+            if settings.AST_CACHE_ENABLED and total_files:
+                logger.info(
+                    f"Parse cache hits: {pipeline['parse_cache_hits']}/{total_files} files "
+                    f"({pipeline['parse_cache_hits'] / total_files:.0%})"
+                )
             
-            # Step 3: Generate embeddings for remaining chunks
+            # Step 3: Retry chunks whose embedding window failed
             if settings.OPENAI_API_KEY:
-                if window_chunks:
-                    await self._maybe_pause()
-                    if not embedding_started:
-                        embedding_started = True
-                        await self._emit_progress({
-                            "type": "progress",
-                            "stage": "embedding_generation",
-                            "file_index": file_count,
-                            "total_files": total_files
-                        })
-                        await self._emit_progress({
-                            "type": "log",
-                            "level": "info",
-                            "message": "🔄 Starting embeddings generation"
-                        })
-                    try:
-                        embedding_count = await asyncio.wait_for(
-                            self._generate_embeddings(
-                                window_chunks,
-                                batch_size=self.EMBED_BATCH_SIZE
-                            ),
-                            timeout=120.0
-                        )
-                    except asyncio.TimeoutError:
-                        await self._register_embedding_failure(
-                            "⚠️ Embedding generation timed out; skipping final window."
-                        )
-                        embedding_count = 0
-                    await self._emit_progress({
-                        "type": "log",
-                        "level": "info",
-                        "message": f"✓ Embedded final window - {embedding_count} embeddings created"
-                    })
-                
-                chunks_to_embed = await self.db.execute(
-                    select(CodeChunkModel).where(
-                        CodeChunkModel.project_id == project_id,
-                        CodeChunkModel.embedding == None
-                    )
-                )
-                remaining = chunks_to_embed.scalars().all()
+                remaining = pipeline["unembedded"]
                 if remaining:
                     await self._maybe_pause()
                     if not embedding_started:
@@ -426,19 +540,10 @@ class CodeChunker:
                             "level": "info",
                             "message": "🔄 Starting embeddings generation"
                         })
-                    try:
-                        embedding_count = await asyncio.wait_for(
-                            self._generate_embeddings(
-                                remaining,
-                                batch_size=self.EMBED_BATCH_SIZE
-                            ),
-                            timeout=120.0
-                        )
-                    except asyncio.TimeoutError:
-                        await self._register_embedding_failure(
-                            "⚠️ Embedding generation timed out; skipping remaining chunks."
-                        )
-                        embedding_count = 0
+                    embedding_count = await self._generate_embeddings(
+                        remaining,
+                        batch_size=self.EMBED_BATCH_SIZE
+                    )
                     logger.debug(f"Generated embeddings for {embedding_count} chunks")
                 else:
                     await self._emit_progress({
@@ -465,6 +570,8 @@ class CodeChunker:
             project.status = ProjectStatus.COMPLETED
             await self.db.commit()
             
+            await asyncio.to_thread(_prune_disk_caches)
+            
             logger.info(f"Preprocessing finished for project: {project_id}")
             
             # Emit completion event
@@ -499,12 +606,284 @@ class CodeChunker:
             
             raise
     
-    async def _generate_embeddings(self, chunks: List[CodeChunkModel], batch_size: int = 20) -> int:
-        """Generate embeddings for code chunks using OpenAI"""
-        try:
-            from openai import AsyncOpenAI
+    def _iter_source_files(self, root: str):
+        """Yield (path, relative_path, file_name, language) for parseable files under root.
+        
+        Walks with the analyzer's skip rules (names and wildcard patterns), so chunking
+        covers exactly the files the repository analysis counted.
+        """
+        prefix_len = len(os.path.join(root, ""))
+        for entry in self.analyzer.iter_files(root):
+            language = self.parser.detect_language(entry.name)
+            if language:
+                yield entry.path, entry.path[prefix_len:], entry.name, language
+    
+    async def _run_chunking_pipeline(
+        self,
+        project_id: str,
+        source_files: List[Tuple[str, str, str, str]],
+        repository_id: UUID,
+        repo_metadata: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Walk, parse, persist and embed files as overlapping stages.
+        
+        A producer feeds source files to parser workers through bounded queues;
+        a single writer persists chunks and streams them to the embedder, which
+        micro-batches them, so parsing and DB writes continue while embedding
+        requests are in flight.
+        """
+        parse_queue: asyncio.Queue = asyncio.Queue(maxsize=self.PARSE_QUEUE_SIZE)
+        write_queue: asyncio.Queue = asyncio.Queue(maxsize=self.PARSE_QUEUE_SIZE)
+        embed_queue: asyncio.Queue = asyncio.Queue(maxsize=self.EMBED_QUEUE_SIZE)
+        state = {"file_count": 0, "total_chunks": 0, "embedding_started": False, "unembedded": [], "parse_cache_hits": 0}
+        total_files = len(source_files)
+        important_pattern = self._build_important_pattern(repo_metadata)
+        
+        async def produce_files():
+            for source_file in source_files:
+                await self._maybe_pause()
+                await parse_queue.put(source_file)
+            for _ in range(self.PARSE_WORKERS):
+                await parse_queue.put(None)
+        
+        async def parse_files():
+            loop = asyncio.get_running_loop()
+            cache_dir = str(storage_service.cache_path / "ast") if settings.AST_CACHE_ENABLED else None
+            while True:
+                item = await parse_queue.get()
+                if item is None:
+                    break
+                file_path, relative_path, file, language = item
+                # Parse, split and count lines in a worker process, off the event loop.
+                # A dead worker breaks the whole pool: replace it and retry the file once.
+                raw_chunks, chunks, lines_of_code = [], [], 0
+                for attempt in range(2):
+                    pool = _get_parse_pool()
+                    try:
+                        raw_chunks, chunks, lines_of_code, cache_hit = await loop.run_in_executor(
+                            pool, _parse_worker, file_path, language, cache_dir
+                        )
+                        state["parse_cache_hits"] += cache_hit
+                        break
+                    except BrokenProcessPool:
+                        _reset_parse_pool(pool)
+                        if attempt:
+                            raise RuntimeError(f"Parser worker process died while parsing {relative_path}")
+                        logger.warning(f"Parser worker process died while parsing {file_path}; restarting the pool")
+                    except Exception as e:
+                        logger.warning(f"Error parsing {file_path}: {e}")
+                        break
+                await write_queue.put((relative_path, file, language, raw_chunks, chunks, lines_of_code))
+            await write_queue.put(None)
+        
+        async def write_files():
+            finished_workers = 0
+            while finished_workers < self.PARSE_WORKERS:
+                item = await write_queue.get()
+                if item is None:
+                    finished_workers += 1
+                    continue
+                relative_path, file, language, raw_chunks, chunks, lines_of_code = item
+                
+                state["file_count"] += 1
+                file_count = state["file_count"]
+                progress_percent = min(int((file_count / max(total_files, 1)) * 100), 99)  # Cap at 99% until complete
+                
+                # Emit progress with file info
+                await self._emit_progress({
+                    "type": "progress",
+                    "percent": progress_percent,
+                    "stage": "code_chunking",
+                    "current_file": relative_path,
+                    "file_index": file_count,
+                    "total_files": total_files
+                })
+                
+                # Emit detailed log about file processing
+                await self._emit_progress({
+                    "type": "log",
+                    "level": "info",
+                    "message": f"Processing: {relative_path} ({language})"
+                })
+                
+                logger.debug(f"Processing file ({file_count}/{total_files}): {relative_path}")
+                
+                if not chunks:
+                    continue
+                
+                try:
+                    # Emit log about chunks found
+                    await self._emit_progress({
+                        "type": "log",
+                        "level": "info",
+                        "message": f"✓ Extracted {len(chunks)} code chunks from {relative_path}"
+                    })
+                    
+                    # Check if file is important
+                    is_important = self._is_important_file(relative_path, important_pattern)
+                    
+                    # Create file metadata record
+                    file_meta = FileMetadata(
+                        project_id=project_id,
+                        repository_id=repository_id,
+                        file_path=relative_path,
+                        file_name=file,
+                        file_type=self._get_file_type(relative_path),
+                        language=language,
+                        lines_of_code=lines_of_code,
+                        is_test_file=self._is_test_file(file),
+                        is_important=is_important,
+                        has_docstring=self._has_docstring(chunks),
+                        function_count=sum(1 for c in raw_chunks if c.chunk_type == "function"),
+                        class_count=sum(1 for c in raw_chunks if c.chunk_type == "class"),
+                        chunks_created=len(chunks),
+                        is_processed=True,
+                    )
+                    
+                    # Create code chunk records
+                    chunk_records = [
+                        CodeChunkModel(
+                            project_id=project_id,
+                            file_path=relative_path,
+                            chunk_type=chunk.chunk_type,
+                            name=chunk.name,
+                            content=chunk.content,
+                            start_line=chunk.start_line,
+                            end_line=chunk.end_line,
+                            language=language,
+                            is_important=is_important,
+                            docstring=chunk.docstring,
+                            dependencies={"external": chunk.dependencies},
+                            parameters=chunk.parameters,
+                            return_type=chunk.return_type,
+                        )
+                        for chunk in chunks
+                    ]
+                    for record, chunk in zip(chunk_records, chunks):
+                        record.embed_text = self._embedding_text(chunk)
+                    
+                    # File metadata and its chunks go in one transaction
+                    async with self._db_lock:
+                        self.db.add(file_meta)
+                        self.db.add_all(chunk_records)
+                        await self.db.commit()
+                    state["total_chunks"] += len(chunk_records)
+                    logger.debug(f"Extracted {len(chunks)} chunks from {relative_path}")
+                    
+                    if settings.OPENAI_API_KEY:
+                        await embed_queue.put(chunk_records)
+                
+                except Exception as e:
+                    logger.warning(f"Error processing {relative_path}: {e}")
+                    continue
             
-            client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, timeout=60.0)
+            await embed_queue.put(None)
+        
+        async def embed_window(window_chunks: List[CodeChunkModel]):
+            await self._maybe_pause()
+            if not state["embedding_started"]:
+                state["embedding_started"] = True
+                await self._emit_progress({
+                    "type": "progress",
+                    "stage": "embedding_generation",
+                    "file_index": state["file_count"],
+                    "total_files": total_files
+                })
+                await self._emit_progress({
+                    "type": "log",
+                    "level": "info",
+                    "message": "🔄 Starting embeddings generation"
+                })
+            
+            # Each API call has its own timeout and rate limiting, so no window-wide deadline
+            embedding_count = await self._generate_embeddings(
+                window_chunks,
+                batch_size=self.EMBED_BATCH_SIZE,
+                unembedded=state["unembedded"]
+            )
+            await self._emit_progress({
+                "type": "log",
+                "level": "info",
+                "message": f"✓ Embedded window - {embedding_count} embeddings created"
+            })
+        
+        async def embed_windows():
+            # Micro-batch: flush when EMBED_MAX_BATCH_SIZE chunks are pending or the
+            # oldest pending chunk has waited EMBED_MAX_LATENCY_MS
+            loop = asyncio.get_running_loop()
+            pending: List[CodeChunkModel] = []
+            deadline = 0.0
+            get_task: Optional[asyncio.Future] = None
+            finished = False
+            try:
+                while not finished:
+                    if get_task is None:
+                        get_task = asyncio.ensure_future(embed_queue.get())
+                    timeout = max(0.0, deadline - loop.time()) if pending else None
+                    done, _ = await asyncio.wait({get_task}, timeout=timeout)
+                    if get_task in done:
+                        item = get_task.result()
+                        get_task = None
+                        if item is None:
+                            finished = True
+                        elif item:
+                            if not pending:
+                                deadline = loop.time() + self.EMBED_MAX_LATENCY_MS / 1000
+                            pending.extend(item)
+                    
+                    while len(pending) >= self.EMBED_MAX_BATCH_SIZE:
+                        window_chunks = pending[:self.EMBED_MAX_BATCH_SIZE]
+                        pending = pending[self.EMBED_MAX_BATCH_SIZE:]
+                        await embed_window(window_chunks)
+                        deadline = loop.time() + self.EMBED_MAX_LATENCY_MS / 1000
+                    if pending and (finished or loop.time() >= deadline):
+                        window_chunks, pending = pending, []
+                        await embed_window(window_chunks)
+            finally:
+                if get_task is not None:
+                    get_task.cancel()
+        
+        stages = [
+            asyncio.create_task(produce_files()),
+            *(asyncio.create_task(parse_files()) for _ in range(self.PARSE_WORKERS)),
+            asyncio.create_task(write_files()),
+            asyncio.create_task(embed_windows()),
+        ]
+        try:
+            await asyncio.gather(*stages)
+        except BaseException:
+            # One stage failed (e.g. pause timeout or embedding abort): stop the rest
+            for task in stages:
+                task.cancel()
+            await asyncio.gather(*stages, return_exceptions=True)
+            raise
+        
+        return state
+    
+    async def _generate_embeddings(
+        self,
+        chunks: List[CodeChunkModel],
+        batch_size: int = 20,
+        unembedded: Optional[List[CodeChunkModel]] = None
+    ) -> int:
+        """Generate embeddings for code chunks using OpenAI.
+        
+        Chunks whose embeddings were not stored are appended to unembedded when given.
+        """
+        persisted = set()
+        if AsyncOpenAI is None:
+            await self._emit_progress({
+                "type": "log",
+                "level": "warning",
+                "message": "⚠️ OpenAI library not available - skipping embeddings"
+            })
+            logger.warning("OpenAI library not available")
+            if unembedded is not None:
+                unembedded.extend(chunks)
+            return 0
+        
+        try:
+            client = self._get_openai_client()
             count = 0
             await self._maybe_pause()
             
@@ -515,27 +894,56 @@ class CodeChunker:
                 "message": f"🔄 Starting embeddings generation for {len(chunks)} chunks using OpenAI API..."
             })
             
-            # Process chunks in batches
-            total_batches = (len(chunks) + batch_size - 1) // batch_size
+            # Reuse vectors for texts embedded before; send each distinct new text once
+            cache_dir = str(storage_service.cache_path / "embeddings") if settings.EMBEDDING_CACHE_ENABLED else None
+            chunk_keys = {chunk.id: self._embedding_key(chunk) for chunk in chunks}
+            missing = {key for key in chunk_keys.values() if key not in self._embedding_memo}
+            if missing and cache_dir:
+                self._remember_embeddings(await asyncio.to_thread(_load_cached_embeddings, cache_dir, missing))
             
-            for batch_idx, i in enumerate(range(0, len(chunks), batch_size), 1):
-                await self._maybe_pause()
-                batch = chunks[i:i + batch_size]
-                
-                # Emit progress for this batch
+            rows: List[Dict[str, Any]] = []
+            waiting: Dict[str, List[CodeChunkModel]] = {}
+            novel_chunks: List[CodeChunkModel] = []
+            for chunk in chunks:
+                key = chunk_keys[chunk.id]
+                vector = self._embedding_memo.get(key)
+                if vector is not None:
+                    rows.append(self._embedding_row(chunk, vector))
+                    count += 1
+                elif key in waiting:
+                    waiting[key].append(chunk)
+                else:
+                    waiting[key] = [chunk]
+                    novel_chunks.append(chunk)
+            if count:
                 await self._emit_progress({
                     "type": "log",
                     "level": "info",
-                    "message": f"⏳ Processing embedding batch {batch_idx}/{total_batches} ({len(batch)} chunks)..."
+                    "message": f"♻️ Reused {count} cached embeddings"
                 })
-                
-                # Prepare texts for embedding
-                texts = [
-                    f"{chunk.name}\n{chunk.chunk_type}\n{chunk.docstring or ''}\n{chunk.content[:500]}"
-                    for chunk in batch
-                ]
-                
-                try:
+            
+            # Split into batches; API calls run concurrently, bounded by EMBED_MAX_INFLIGHT
+            batches = [novel_chunks[i:i + batch_size] for i in range(0, len(novel_chunks), batch_size)]
+            total_batches = len(batches)
+            semaphore = asyncio.Semaphore(self.EMBED_MAX_INFLIGHT)
+            
+            async def embed_batch(batch_idx: int, batch: List[CodeChunkModel]):
+                async with semaphore:
+                    await self._maybe_pause()
+                    
+                    # Emit progress for this batch
+                    await self._emit_progress({
+                        "type": "log",
+                        "level": "info",
+                        "message": f"⏳ Processing embedding batch {batch_idx}/{total_batches} ({len(batch)} chunks)..."
+                    })
+                    
+                    # Prepare texts for embedding
+                    texts = [
+                        getattr(chunk, "embed_text", None) or self._embedding_text(chunk)
+                        for chunk in batch
+                    ]
+                    
                     # Get embeddings from OpenAI with timeout
                     await self._maybe_pause()
                     await self._emit_progress({
@@ -545,13 +953,7 @@ class CodeChunker:
                     })
                     
                     try:
-                        response = await asyncio.wait_for(
-                            client.embeddings.create(
-                                input=texts,
-                                model="text-embedding-3-small"
-                            ),
-                            timeout=60.0  # 60 second timeout per batch
-                        )
+                        return await self._create_embeddings(client, texts, batch_idx)
                     except asyncio.TimeoutError:
                         await self._emit_progress({
                             "type": "log",
@@ -560,56 +962,66 @@ class CodeChunker:
                         })
                         await self._maybe_pause()
                         # Retry once with timeout
-                        response = await asyncio.wait_for(
-                            client.embeddings.create(
-                                input=texts,
-                                model="text-embedding-3-small"
-                            ),
-                            timeout=60.0
-                        )
-                    
-                    await self._maybe_pause()
-                    
-                    # Store embeddings
-                    for idx, chunk in enumerate(batch):
-                        if idx < len(response.data):
-                            embedding = response.data[idx].embedding
-                            chunk.embedding = embedding
-                            chunk.embedding_model = "text-embedding-3-small"
-                            count += 1
-                    
-                    await self.db.commit()
-                    
-                    # Record embedding usage for analysis (tokens + cost)
-                    if self._progress and self._analysis_id and getattr(response, "usage", None):
-                        total_tokens = getattr(response.usage, "total_tokens", 0) or 0
-                        if total_tokens > 0:
-                            await record_embedding_usage(
-                                self._progress,
-                                self._analysis_id,
-                                total_tokens,
-                                "text-embedding-3-small",
-                            )
-                    
-                    # Emit progress for successful batch
-                    await self._emit_progress({
-                        "type": "log",
-                        "level": "info",
-                        "message": f"✓ Embedded batch {batch_idx}/{total_batches} - {count} embeddings created so far"
-                    })
-                    
-                except asyncio.TimeoutError as e:
+                        return await self._create_embeddings(client, texts, batch_idx)
+            
+            responses = await asyncio.gather(
+                *(embed_batch(batch_idx, batch) for batch_idx, batch in enumerate(batches, 1)),
+                return_exceptions=True
+            )
+            
+            # Apply results in batch order and persist the whole window in one bulk UPDATE
+            fresh: Dict[str, array] = {}
+            window_tokens = 0
+            for batch_idx, (batch, response) in enumerate(zip(batches, responses), 1):
+                if isinstance(response, asyncio.TimeoutError):
                     await self._register_embedding_failure(
-                        f"⚠️ Timeout on batch {batch_idx}: {str(e)[:100]}. Skipping this batch."
+                        f"⚠️ Timeout on batch {batch_idx}: {str(response)[:100]}. Skipping this batch."
                     )
-                    logger.warning(f"Timeout generating embeddings for batch {batch_idx}: {e}")
+                    logger.warning(f"Timeout generating embeddings for batch {batch_idx}: {response}")
                     continue
-                except Exception as e:
+                if isinstance(response, BaseException):
                     await self._register_embedding_failure(
-                        f"⚠️ Error on batch {batch_idx}: {str(e)[:100]}. Skipping this batch."
+                        f"⚠️ Error on batch {batch_idx}: {str(response)[:100]}. Skipping this batch."
                     )
-                    logger.warning(f"Error generating embeddings for batch {batch_idx}: {e}")
+                    logger.warning(f"Error generating embeddings for batch {batch_idx}: {response}")
                     continue
+                
+                for chunk, item in zip(batch, response.data):
+                    key = chunk_keys[chunk.id]
+                    fresh[key] = array("f", item.embedding)
+                    for same_text_chunk in waiting[key]:
+                        rows.append(self._embedding_row(same_text_chunk, item.embedding))
+                        count += 1
+                
+                if getattr(response, "usage", None):
+                    window_tokens += getattr(response.usage, "total_tokens", 0) or 0
+                
+                # Emit progress for successful batch
+                await self._emit_progress({
+                    "type": "log",
+                    "level": "info",
+                    "message": f"✓ Embedded batch {batch_idx}/{total_batches} - {count} embeddings created so far"
+                })
+            
+            if rows:
+                async with self._db_lock:
+                    await self.db.execute(update(CodeChunkModel), rows)
+                    await self.db.commit()
+                    persisted.update(row["id"] for row in rows)
+                    
+                    # Record embedding usage for analysis (tokens + cost)
+                    if self._progress and self._analysis_id and window_tokens > 0:
+                        await record_embedding_usage(
+                            self._progress,
+                            self._analysis_id,
+                            window_tokens,
+                            self.EMBEDDING_MODEL,
+                        )
+            
+            if fresh:
+                self._remember_embeddings(fresh)
+                if cache_dir:
+                    await asyncio.to_thread(_store_cached_embeddings, cache_dir, fresh)
             
             # Emit completion
             await self._emit_progress({
@@ -620,14 +1032,6 @@ class CodeChunker:
             
             return count
         
-        except ImportError:
-            await self._emit_progress({
-                "type": "log",
-                "level": "warning",
-                "message": "⚠️ OpenAI library not available - skipping embeddings"
-            })
-            logger.warning("OpenAI library not available")
-            return 0
         except Exception as e:
             await self._emit_progress({
                 "type": "log",
@@ -636,22 +1040,79 @@ class CodeChunker:
             })
             logger.error(f"Error in embedding generation: {e}", exc_info=True)
             return 0
+        finally:
+            if unembedded is not None:
+                unembedded.extend(chunk for chunk in chunks if chunk.id not in persisted)
     
-    def _is_important_file(self, file_path: str, repo_metadata: Dict[str, Any]) -> bool:
-        """Check if file is important"""
+    def _get_openai_client(self) -> Any:
+        """OpenAI client created on first use and reused so its connection pool is kept"""
+        if self._openai_client is None:
+            self._openai_client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, timeout=60.0)
+        return self._openai_client
+    
+    async def _create_embeddings(self, client: Any, texts: List[str], batch_idx: int) -> Any:
+        """Call the embeddings API under the shared rate limiter, honouring Retry-After on 429s"""
+        limiter = _get_embedding_limiter()
+        est_tokens = sum(len(text) // 4 + 1 for text in texts)
+        for attempt in range(self.EMBED_RATE_LIMIT_RETRIES + 1):
+            await limiter.acquire(est_tokens)
+            try:
+                return await asyncio.wait_for(
+                    client.embeddings.create(
+                        input=texts,
+                        model=self.EMBEDDING_MODEL
+                    ),
+                    timeout=60.0  # 60 second timeout per batch
+                )
+            except RateLimitError as e:
+                if attempt == self.EMBED_RATE_LIMIT_RETRIES:
+                    raise
+                delay = _retry_after_seconds(e, default=2 ** attempt)
+                limiter.pause_for(delay)
+                await self._emit_progress({
+                    "type": "log",
+                    "level": "warning",
+                    "message": f"⏸️ Rate limited on batch {batch_idx}; retrying in {delay:.1f}s"
+                })
+    
+    @classmethod
+    def _embedding_text(cls, chunk) -> str:
+        """Build the text sent to the embedding model for a chunk, capped to one input's token limit"""
+        text = f"{chunk.name}\n{chunk.chunk_type}\n{chunk.docstring or ''}\n{chunk.content[:500]}"
+        return text[:cls.EMBED_MAX_INPUT_CHARS]
+    
+    def _embedding_key(self, chunk) -> str:
+        """Hash of the model and embedding text, used to memoize vectors"""
+        text = getattr(chunk, "embed_text", None) or self._embedding_text(chunk)
+        return hashlib.sha256(f"{self.EMBEDDING_MODEL}\0{text}".encode()).hexdigest()
+    
+    def _embedding_row(self, chunk, vector) -> Dict[str, Any]:
+        """Bulk UPDATE parameters storing one chunk's embedding"""
+        return {"id": chunk.id, "embedding": list(vector), "embedding_model": self.EMBEDDING_MODEL}
+    
+    def _remember_embeddings(self, vectors: Dict[str, array]) -> None:
+        """Add vectors to the in-memory memo, evicting the oldest beyond EMBED_MEMO_SIZE"""
+        self._embedding_memo.update(vectors)
+        while len(self._embedding_memo) > self.EMBED_MEMO_SIZE:
+            del self._embedding_memo[next(iter(self._embedding_memo))]
+    
+    def _build_important_pattern(self, repo_metadata: Dict[str, Any]) -> Optional[re.Pattern]:
+        """Compile entry points and config files into one substring-matching regex"""
         entry_points = repo_metadata.get("entry_points", {})
         config_files = repo_metadata.get("config_files_list", [])
         
-        return any(
-            entry_point in file_path for entry_point in entry_points.values()
-        ) or any(
-            config_file in file_path for config_file in config_files
-        )
+        names = list(entry_points.values()) + list(config_files)
+        if not names:
+            return None
+        return re.compile("|".join(re.escape(name) for name in dict.fromkeys(names)))
+    
+    def _is_important_file(self, file_path: str, important_pattern: Optional[re.Pattern]) -> bool:
+        """Check if file is important"""
+        return bool(important_pattern and important_pattern.search(file_path))
     
     def _is_test_file(self, file_name: str) -> bool:
         """Check if file is a test file"""
-        test_patterns = ["test_", "_test.", ".test.", ".spec."]
-        return any(pattern in file_name for pattern in test_patterns)
+        return self.TEST_FILE_PATTERN.search(file_name) is not None
     
     def _get_file_type(self, file_path: str) -> str:
         """Determine file type"""
@@ -667,13 +1128,13 @@ class CodeChunker:
         
         return "code"
     
-    def _count_lines(self, file_path: str) -> int:
-        """Count lines in file"""
-        try:
-            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                return len(f.readlines())
-        except Exception:
+    @staticmethod
+    def _count_lines(raw: bytes) -> int:
+        """Count lines in raw file content with universal newline handling"""
+        if not raw:
             return 0
+        newlines = raw.count(b"\n") + raw.count(b"\r") - raw.count(b"\r\n")
+        return newlines + (0 if raw.endswith((b"\n", b"\r")) else 1)
     
     def _has_docstring(self, chunks: List[CodeChunk]) -> bool:
         """Check if any chunk has docstring"""
@@ -1,12 +1,110 @@
 """Code parser service - parses code files and extracts functions, classes, etc."""
 import ast
+import os
 import re
-from pathlib import Path
+from bisect import bisect_left, bisect_right
+from collections import deque
+from itertools import accumulate, count
+from operator import add
 from typing import List, Dict, Any, Tuple, Optional
 from src.core.logging_config import get_logger
 
+try:
+    import numpy as np  # installed with pgvector; optional here
+except ImportError:
+    np = None
+
 logger = get_logger(__name__)
 
+# Node types whose children can include statements (and so function/class definitions)
+_STATEMENT_CONTAINERS = (ast.stmt, ast.excepthandler, ast.match_case)
+
+# Regex patterns for the simplified (non-AST) parsers; the JS/TS pieces are combined per parser
+_JS_FUNCTION = r"(?P<fn>(?:async\s+)?function\s+(?P<fn_name>\w+)\s*\((?P<fn_params>.*?)\)\s*\{)"
+_JS_ARROW = r"(?P<arrow>(?:const|let|var)\s+(?P<arrow_name>\w+)\s*=\s*(?:async\s*)?\((?P<arrow_params>.*?)\)\s*=>)"
+_JS_CLASS = r"(?P<cls>class\s+(?P<cls_name>\w+)(?:\s+extends\s+(?P<cls_base>\w+))?\s*\{)"
+_TS_INTERFACE = r"(?P<iface>interface\s+(?P<iface_name>\w+)\s*\{)"
+_JAVA_CLASS_PATTERN = re.compile(r"(?:public|private|protected)?\s*class\s+(\w+)(?:\s+extends\s+(\w+))?")
+_CSHARP_CLASS_PATTERN = re.compile(r"(?:public|private|internal)?\s*class\s+(\w+)(?:\s*:\s*(\w+))?")
+
+# Tokens that matter when matching braces: braces themselves, plus comments and
+# string literals (skipped whole so braces inside them are ignored)
+_BLOCK_TOKEN_PATTERN = re.compile(
+    r"""[{}]|//[^\n]*|/\*.*?(?:\*/|\Z)|@"(?:[^"]|"")*"|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*'|`(?:\\.|[^`\\])*`""",
+    re.DOTALL,
+)
+# Rest of a class declaration up to its opening brace (e.g. generics, implements)
+_DECLARATION_TAIL_PATTERN = re.compile(r"[^;{}()\"'/]*\{")
+_ARROW_BODY_PATTERN = re.compile(r"\s*\{")
+
+_STDLIB_SKIP = frozenset({
+    "os", "sys", "re", "json", "datetime", "typing", "pathlib",
+    "logging", "collections", "itertools", "functools",
+})
+
+
+def _line_starts(content: str) -> List[int]:
+    """Offsets where each line of content begins, plus one past the end"""
+    if np is not None and content.isascii():
+        # ASCII: byte offsets equal character offsets, so one vectorized newline scan suffices
+        newlines = np.flatnonzero(np.frombuffer(content.encode("ascii"), dtype=np.uint8) == 10)
+        newlines += 1
+        starts = newlines.tolist()
+        starts.insert(0, 0)
+        starts.append(len(content) + 1)
+        return starts
+    lines = content.split("\n")
+    return [0, *map(add, accumulate(map(len, lines)), count(1))]
+
+
+def _slice_lines(content: str, line_starts: List[int], start_line: int, end_line: int) -> str:
+    """Same text as "\\n".join(lines[start_line - 1:end_line]), sliced straight from content"""
+    end_line = min(end_line, len(line_starts) - 1)
+    if start_line > end_line:
+        return ""
+    return content[line_starts[start_line - 1]:line_starts[end_line] - 1]
+
+
+def _node_source(content: str, line_starts: List[int], node: ast.AST) -> Optional[str]:
+    """Source text of a single-line node, sliced via its line (col offsets count UTF-8 bytes)"""
+    if node.end_lineno != node.lineno or node.lineno >= len(line_starts):
+        return None
+    line = content[line_starts[node.lineno - 1]:line_starts[node.lineno]]
+    if line.isascii():
+        return line[node.col_offset:node.end_col_offset]
+    return line.encode("utf-8")[node.col_offset:node.end_col_offset].decode("utf-8", errors="replace")
+
+
+def _match_braces(content: str) -> Dict[int, int]:
+    """Offset of each opening brace mapped to its closing brace, in one pass over content.
+    
+    Braces inside strings and comments are ignored; unbalanced braces are left out.
+    """
+    closing: Dict[int, int] = {}
+    stack: List[int] = []
+    # The regex skips ordinary text in C, so only braces, strings and comments reach Python
+    for token in _BLOCK_TOKEN_PATTERN.finditer(content):
+        text = token.group()
+        if text == "{":
+            stack.append(token.start())
+        elif text == "}" and stack:
+            closing[stack.pop()] = token.start()
+    return closing
+
+
+def _block_end_line(line_starts: List[int], closing: Dict[int, int], open_pos: Optional[int], fallback_line: int) -> int:
+    """Line of the brace closing the block opened at open_pos, or fallback_line if unbalanced"""
+    close_pos = closing.get(open_pos) if open_pos is not None else None
+    if close_pos is None:
+        return fallback_line
+    return bisect_right(line_starts, close_pos)
+
+
+def _opening_brace(pattern: re.Pattern, content: str, pos: int) -> Optional[int]:
+    """Offset of the brace that pattern matches at pos, if any"""
+    match = pattern.match(content, pos)
+    return match.end() - 1 if match else None
+
 
 class CodeChunk:
     """Represents a parsed code chunk"""
@@ -56,6 +154,20 @@ class CodeChunk:
 class CodeParser:
     """Parses code files and extracts semantic chunks"""
     
+    LANGUAGE_MAP = {
+        ".py": "python",
+        ".js": "javascript",
+        ".jsx": "javascript",
+        ".ts": "typescript",
+        ".tsx": "typescript",
+        ".java": "java",
+        ".cs": "csharp",
+        ".go": "go",
+        ".rs": "rust",
+        ".rb": "ruby",
+        ".php": "php",
+    }
+    
     def __init__(self):
         self.parsers = {
             "python": PythonCodeParser(),
@@ -70,14 +182,28 @@ class CodeParser:
         logger.debug(f"Parsing file: {file_path} ({language})")
         
         try:
-            # Read file content
-            with open(file_path, "r", encoding="utf-8", errors="ignore") as f:
-                content = f.read()
-            
+            # Read raw bytes in one call and decode once
+            with open(file_path, "rb") as f:
+                content = self.decode_source(f.read())
+        except Exception as e:
+            logger.error(f"Error parsing file {file_path}: {e}", exc_info=True)
+            return []
+        
+        return self.parse_content(content, file_path, language)
+    
+    @staticmethod
+    def decode_source(raw: bytes) -> str:
+        """Decode file bytes like text-mode open(encoding="utf-8", errors="ignore")"""
+        return raw.decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
+    
+    def parse_content(self, content: str, file_path: str, language: str) -> List[CodeChunk]:
+        """Parse already-read file content and extract chunks"""
+        try:
             # Get appropriate parser
             parser = self.parsers.get(language)
             if parser:
-                chunks = parser.parse(content, file_path, language)
+                # Line offsets are computed once here and shared by the language parser
+                chunks = parser.parse(content, _line_starts(content), file_path, language)
                 logger.debug(f"Extracted {len(chunks)} chunks from {file_path}")
                 return chunks
             else:
@@ -90,32 +216,15 @@ class CodeParser:
     
     def detect_language(self, file_path: str) -> Optional[str]:
         """Detect language from file extension"""
-        ext = Path(file_path).suffix.lower()
-        
-        language_map = {
-            ".py": "python",
-            ".js": "javascript",
-            ".jsx": "javascript",
-            ".ts": "typescript",
-            ".tsx": "typescript",
-            ".java": "java",
-            ".cs": "csharp",
-            ".go": "go",
-            ".rs": "rust",
-            ".rb": "ruby",
-            ".php": "php",
-        }
-        
-        return language_map.get(ext)
+        return self.LANGUAGE_MAP.get(os.path.splitext(file_path)[1].lower())
 
 
 class PythonCodeParser:
     """Parses Python code using AST"""
     
-    def parse(self, content: str, file_path: str, language: str) -> List[CodeChunk]:
+    def parse(self, content: str, line_starts: List[int], file_path: str, language: str) -> List[CodeChunk]:
         """Parse Python code and extract chunks"""
         chunks = []
-        lines = content.split("\n")
         
         try:
             tree = ast.parse(content)
@@ -123,15 +232,18 @@ class PythonCodeParser:
             # Extract module docstring
             module_docstring = ast.get_docstring(tree)
             
-            # Extract top-level functions and classes
-            for node in ast.walk(tree):
-                if isinstance(node, ast.FunctionDef):
-                    chunk = self._parse_function(node, content, lines, language, file_path, module_docstring)
+            statements = list(self._iter_definitions(tree))
+            imports = self._collect_imports(statements)
+            
+            # Extract functions (including methods) and classes at any nesting level
+            for node in statements:
+                if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    chunk = self._parse_function(node, content, line_starts, language, file_path, module_docstring, imports)
                     if chunk:
                         chunks.append(chunk)
                 
                 elif isinstance(node, ast.ClassDef):
-                    chunk = self._parse_class(node, content, lines, language, file_path)
+                    chunk = self._parse_class(node, content, line_starts, language, file_path, imports)
                     if chunk:
                         chunks.append(chunk)
         
@@ -140,14 +252,40 @@ class PythonCodeParser:
         
         return chunks
     
-    def _parse_function(self, node: ast.FunctionDef, content: str, lines: List[str], language: str, file_path: str, module_doc: Optional[str]) -> Optional[CodeChunk]:
+    @staticmethod
+    def _iter_definitions(tree: ast.Module):
+        """Yield statement nodes breadth-first, in ast.walk order, without visiting expressions.
+        
+        Definitions only occur as statements, so descending through statement
+        bodies, except handlers and match cases is enough to find all of them.
+        """
+        queue = deque([tree])
+        while queue:
+            node = queue.popleft()
+            for child in ast.iter_child_nodes(node):
+                if isinstance(child, _STATEMENT_CONTAINERS):
+                    queue.append(child)
+                    yield child
+    
+    @staticmethod
+    def _collect_imports(statements: List[ast.stmt]) -> Tuple[List[int], List[str]]:
+        """Collect top-level package names of import statements, sorted by line"""
+        imports = []
+        for node in statements:
+            if isinstance(node, ast.Import):
+                imports.extend((node.lineno, alias.name.split(".")[0]) for alias in node.names)
+            elif isinstance(node, ast.ImportFrom) and node.module:
+                imports.append((node.lineno, node.module.split(".")[0]))
+        imports.sort()
+        return [lineno for lineno, _ in imports], [name for _, name in imports]
+    
+    def _parse_function(self, node: ast.FunctionDef, content: str, line_starts: List[int], language: str, file_path: str, module_doc: Optional[str], imports: Tuple[List[int], List[str]]) -> Optional[CodeChunk]:
         """Parse function definition"""
         start_line = node.lineno
         end_line = node.end_lineno or node.lineno
         
         # Extract function content
-        func_lines = lines[start_line - 1:end_line]
-        func_content = "\n".join(func_lines)
+        func_content = _slice_lines(content, line_starts, start_line, end_line)
         
         # Extract parameters
         parameters = {}
@@ -158,12 +296,12 @@ class PythonCodeParser:
         docstring = ast.get_docstring(node)
         
         # Extract dependencies (imports used)
-        dependencies = self._extract_dependencies_from_code(func_content)
+        dependencies = self._dependencies_in_range(imports, start_line, end_line)
         
-        # Try to extract return type
+        # Try to extract return type (multi-line annotations are normalized via unparse)
         return_type = None
         if node.returns:
-            return_type = ast.unparse(node.returns) if hasattr(ast, 'unparse') else str(node.returns)
+            return_type = _node_source(content, line_starts, node.returns) or ast.unparse(node.returns)
         
         return CodeChunk(
             name=node.name,
@@ -178,23 +316,22 @@ class PythonCodeParser:
             return_type=return_type,
         )
     
-    def _parse_class(self, node: ast.ClassDef, content: str, lines: List[str], language: str, file_path: str) -> Optional[CodeChunk]:
+    def _parse_class(self, node: ast.ClassDef, content: str, line_starts: List[int], language: str, file_path: str, imports: Tuple[List[int], List[str]]) -> Optional[CodeChunk]:
         """Parse class definition"""
         start_line = node.lineno
         end_line = node.end_lineno or node.lineno
         
         # Extract class content
-        class_lines = lines[start_line - 1:end_line]
-        class_content = "\n".join(class_lines)
+        class_content = _slice_lines(content, line_starts, start_line, end_line)
         
         # Extract docstring
         docstring = ast.get_docstring(node)
         
         # Extract dependencies
-        dependencies = self._extract_dependencies_from_code(class_content)
+        dependencies = self._dependencies_in_range(imports, start_line, end_line)
         
         # Count methods
-        method_count = sum(1 for item in node.body if isinstance(item, ast.FunctionDef))
+        method_count = sum(1 for item in node.body if isinstance(item, (ast.FunctionDef, ast.AsyncFunctionDef)))
         
         return CodeChunk(
             name=node.name,
@@ -208,126 +345,103 @@ class PythonCodeParser:
             parameters={"methods": method_count},
         )
     
-    def _extract_dependencies_from_code(self, code: str) -> List[str]:
-        """Extract external dependencies mentioned in code"""
-        dependencies = []
-        
-        # Simple regex-based extraction
-        import_pattern = r"from\s+(\w+)|import\s+(\w+)"
-        matches = re.findall(import_pattern, code)
-        
-        for match in matches:
-            dep = match[0] or match[1]
-            if dep and dep not in ["os", "sys", "re", "json", "datetime"]:  # Skip stdlib
-                dependencies.append(dep)
-        
-        return list(set(dependencies))[:5]  # Limit to 5
+    def _dependencies_in_range(self, imports: Tuple[List[int], List[str]], start_line: int, end_line: int) -> List[str]:
+        """External dependencies imported between start_line and end_line; common stdlib modules are skipped"""
+        linenos, names = imports
+        dependencies = set(names[bisect_left(linenos, start_line):bisect_right(linenos, end_line)])
+        return list(dependencies - _STDLIB_SKIP)[:5]  # Limit to 5
 
 
 class JavaScriptCodeParser:
     """Parses JavaScript code using regex (simplified)"""
     
-    def parse(self, content: str, file_path: str, language: str) -> List[CodeChunk]:
+    # One pass finds functions, arrow functions and classes
+    PATTERN = re.compile(f"{_JS_FUNCTION}|{_JS_ARROW}|{_JS_CLASS}")
+    
+    def parse(self, content: str, line_starts: List[int], file_path: str, language: str) -> List[CodeChunk]:
         """Parse JavaScript code and extract chunks"""
-        chunks = []
-        lines = content.split("\n")
-        
-        # Extract functions
-        function_pattern = r"(?:async\s+)?function\s+(\w+)\s*\((.*?)\)\s*\{|(?:const|let|var)\s+(\w+)\s*=\s*(?:async\s*)?\((.*?)\)\s*=>"
-        
-        for match in re.finditer(function_pattern, content):
-            func_name = match.group(1) or match.group(3)
-            params = match.group(2) or match.group(4)
-            start_pos = content[:match.start()].count("\n") + 1
+        functions: List[CodeChunk] = []
+        classes: List[CodeChunk] = []
+        interfaces: List[CodeChunk] = []
+        closing = _match_braces(content)
+        
+        for match in self.PATTERN.finditer(content):
+            kind = match.lastgroup
+            start_pos = bisect_right(line_starts, match.start())
             
-            # Find end of function
-            end_pos = start_pos + 5  # Simple approximation
+            if kind in ("fn", "arrow"):
+                # Find end of function; expression-bodied arrows keep the old approximation
+                if kind == "fn":
+                    open_pos = match.end() - 1
+                else:
+                    open_pos = _opening_brace(_ARROW_BODY_PATTERN, content, match.end())
+                end_pos = _block_end_line(line_starts, closing, open_pos, start_pos + 5)
+                functions.append(CodeChunk(
+                    name=match.group("fn_name") or match.group("arrow_name"),
+                    chunk_type="function",
+                    content=_slice_lines(content, line_starts, start_pos, end_pos),
+                    start_line=start_pos,
+                    end_line=end_pos,
+                    language=language,
+                    parameters={"params": match.group("fn_params") or match.group("arrow_params")},
+                ))
             
-            chunk = CodeChunk(
-                name=func_name,
-                chunk_type="function",
-                content="\n".join(lines[start_pos - 1:end_pos]),
-                start_line=start_pos,
-                end_line=end_pos,
-                language=language,
-                parameters={"params": params},
-            )
-            chunks.append(chunk)
-        
-        # Extract classes
-        class_pattern = r"class\s+(\w+)(?:\s+extends\s+(\w+))?\s*\{"
-        
-        for match in re.finditer(class_pattern, content):
-            class_name = match.group(1)
-            extends = match.group(2)
-            start_pos = content[:match.start()].count("\n") + 1
-            end_pos = start_pos + 10
+            elif kind == "cls":
+                extends = match.group("cls_base")
+                end_pos = _block_end_line(line_starts, closing, match.end() - 1, start_pos + 10)
+                classes.append(CodeChunk(
+                    name=match.group("cls_name"),
+                    chunk_type="class",
+                    content=_slice_lines(content, line_starts, start_pos, end_pos),
+                    start_line=start_pos,
+                    end_line=end_pos,
+                    language=language,
+                    parameters={"extends": extends} if extends else {},
+                ))
             
-            chunk = CodeChunk(
-                name=class_name,
-                chunk_type="class",
-                content="\n".join(lines[start_pos - 1:end_pos]),
-                start_line=start_pos,
-                end_line=end_pos,
-                language=language,
-                parameters={"extends": extends} if extends else {},
-            )
-            chunks.append(chunk)
-        
-        return chunks
+            else:
+                end_pos = _block_end_line(line_starts, closing, match.end() - 1, start_pos + 5)
+                interfaces.append(CodeChunk(
+                    name=match.group("iface_name"),
+                    chunk_type="interface",
+                    content=_slice_lines(content, line_starts, start_pos, end_pos),
+                    start_line=start_pos,
+                    end_line=end_pos,
+                    language=language,
+                ))
+        
+        return functions + classes + interfaces
 
 
 class TypeScriptCodeParser(JavaScriptCodeParser):
-    """Parses TypeScript code (extends JavaScript parser)"""
+    """Parses TypeScript code (extends JavaScript parser with interfaces)"""
     
-    def parse(self, content: str, file_path: str, language: str) -> List[CodeChunk]:
-        """Parse TypeScript code"""
-        # Use JavaScript parser but note it's TypeScript
-        chunks = super().parse(content, file_path, language)
-        
-        # Extract interfaces
-        interface_pattern = r"interface\s+(\w+)\s*\{"
-        for match in re.finditer(interface_pattern, content):
-            interface_name = match.group(1)
-            start_pos = content[:match.start()].count("\n") + 1
-            end_pos = start_pos + 5
-            lines = content.split("\n")
-            
-            chunk = CodeChunk(
-                name=interface_name,
-                chunk_type="interface",
-                content="\n".join(lines[start_pos - 1:end_pos]),
-                start_line=start_pos,
-                end_line=end_pos,
-                language=language,
-            )
-            chunks.append(chunk)
-        
-        return chunks
+    PATTERN = re.compile(f"{_JS_FUNCTION}|{_JS_ARROW}|{_JS_CLASS}|{_TS_INTERFACE}")
 
 
 class JavaCodeParser:
     """Parses Java code using regex (simplified)"""
     
-    def parse(self, content: str, file_path: str, language: str) -> List[CodeChunk]:
+    def parse(self, content: str, line_starts: List[int], file_path: str, language: str) -> List[CodeChunk]:
         """Parse Java code and extract chunks"""
         chunks = []
-        lines = content.split("\n")
+        line_count = len(line_starts) - 1
+        closing = _match_braces(content)
         
         # Extract classes
-        class_pattern = r"(?:public|private|protected)?\s*class\s+(\w+)(?:\s+extends\s+(\w+))?"
-        
-        for match in re.finditer(class_pattern, content):
+        for match in _JAVA_CLASS_PATTERN.finditer(content):
             class_name = match.group(1)
             extends = match.group(2)
-            start_pos = content[:match.start()].count("\n") + 1
+            start_pos = bisect_right(line_starts, match.start())
+            open_pos = _opening_brace(_DECLARATION_TAIL_PATTERN, content, match.end())
+            end_pos = _block_end_line(line_starts, closing, open_pos, min(start_pos + 15, line_count))
             
             chunk = CodeChunk(
                 name=class_name,
                 chunk_type="class",
-                content="\n".join(lines[start_pos - 1:min(start_pos + 15, len(lines))]),
+                content=_slice_lines(content, line_starts, start_pos, end_pos),
                 start_line=start_pos,
-                end_line=min(start_pos + 15, len(lines)),
+                end_line=end_pos,
                 language=language,
                 parameters={"extends": extends} if extends else {},
             )
@@ -339,25 +453,26 @@ class JavaCodeParser:
 class CSharpCodeParser:
     """Parses C# code using regex (simplified)"""
     
-    def parse(self, content: str, file_path: str, language: str) -> List[CodeChunk]:
+    def parse(self, content: str, line_starts: List[int], file_path: str, language: str) -> List[CodeChunk]:
         """Parse C# code and extract chunks"""
         chunks = []
-        lines = content.split("\n")
+        line_count = len(line_starts) - 1
+        closing = _match_braces(content)
         
         # Extract classes
-        class_pattern = r"(?:public|private|internal)?\s*class\s+(\w+)(?:\s*:\s*(\w+))?"
-        
-        for match in re.finditer(class_pattern, content):
+        for match in _CSHARP_CLASS_PATTERN.finditer(content):
             class_name = match.group(1)
             inherits = match.group(2)
-            start_pos = content[:match.start()].count("\n") + 1
+            start_pos = bisect_right(line_starts, match.start())
+            open_pos = _opening_brace(_DECLARATION_TAIL_PATTERN, content, match.end())
+            end_pos = _block_end_line(line_starts, closing, open_pos, min(start_pos + 15, line_count))
             
             chunk = CodeChunk(
                 name=class_name,
                 chunk_type="class",
-                content="\n".join(lines[start_pos - 1:min(start_pos + 15, len(lines))]),
+                content=_slice_lines(content, line_starts, start_pos, end_pos),
                 start_line=start_pos,
-                end_line=min(start_pos + 15, len(lines)),
+                end_line=end_pos,
                 language=language,
                 parameters={"inherits": inherits} if inherits else {},
             )
@@ -5,13 +5,26 @@ import logging
 import re
 import subprocess
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 import markdown as md_lib
 
 logger = logging.getLogger(__name__)
 
+_HTML_TAG_PATTERN = re.compile(r"<[^>]+>")
+_ANCHOR_PATTERN = re.compile(r"[^a-zA-Z0-9_-]+")
+_HTML_ESCAPE_TABLE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;"})
+
+# Process-wide Chromium for PDF rendering. Playwright's sync objects are bound to the
+# thread that created them, so every browser call runs on one dedicated worker thread.
+_PW_CTX = None
+_PW_BROWSER = None
+_PW_LOCK = threading.Lock()
+_PW_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="playwright")
+
 # HTML template for PDF: title + body, basic styling
 PDF_HTML_HEAD = """
 <!DOCTYPE html>
@@ -65,121 +78,214 @@ def build_markdown(artifacts: List[Dict[str, Any]], analysis_id: str) -> Dict[st
     }
 
 
-def _mermaid_to_image_svg(mermaid_code: str) -> bytes | None:
-    """Render Mermaid to SVG using mermaid-cli (mmdc) if available. Returns SVG bytes or None."""
+def _mermaid_to_image(mermaid_code: str, image_format: str) -> bytes | None:
+    """Render one Mermaid diagram with mermaid-cli (mmdc). Returns image bytes or None."""
     try:
-        with tempfile.NamedTemporaryFile(suffix=".mmd", delete=False) as f:
-            f.write(mermaid_code.encode("utf-8"))
-            mmd_path = f.name
-        out_path = mmd_path + ".svg"
-        result = subprocess.run(
-            ["npx", "-y", "@mermaid-js/mermaid-cli", "-i", mmd_path, "-o", out_path],
-            capture_output=True,
-            timeout=30,
-            text=True,
-        )
-        Path(mmd_path).unlink(missing_ok=True)
-        if result.returncode == 0 and Path(out_path).exists():
-            data = Path(out_path).read_bytes()
-            Path(out_path).unlink(missing_ok=True)
-            return data
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            in_path = Path(tmp_dir) / "diagram.mmd"
+            out_path = Path(tmp_dir) / f"diagram.{image_format}"
+            in_path.write_text(mermaid_code, encoding="utf-8")
+            result = subprocess.run(
+                ["npx", "-y", "@mermaid-js/mermaid-cli", "-i", str(in_path), "-o", str(out_path)],
+                capture_output=True,
+                timeout=30,
+                text=True,
+            )
+            if result.returncode == 0 and out_path.exists():
+                return out_path.read_bytes()
+            logger.debug("Mermaid CLI failed: %s", result.stderr[:500])
     except (FileNotFoundError, subprocess.TimeoutExpired, Exception) as e:
         logger.debug("Mermaid CLI not available or failed: %s", e)
     return None
 
 
-def _mermaid_to_image_png(mermaid_code: str) -> bytes | None:
-    """Render Mermaid to PNG using mermaid-cli (mmdc) if available."""
+def _mermaid_to_images(mermaid_codes: List[str], image_format: str) -> List[bytes | None]:
+    """Render several Mermaid diagrams with one mermaid-cli (mmdc) run.
+    
+    The diagrams go into one markdown file, which mmdc renders to numbered
+    images (out-1.svg, out-2.svg, ...), so npx/node start up once per export.
+    Diagrams the batch run did not produce (an invalid diagram or a timeout
+    can fail the whole run) are retried one at a time, so only the broken
+    ones are lost. Returns image bytes per diagram, or None where rendering failed.
+    """
+    if not mermaid_codes:
+        return []
+    images: List[bytes | None] = [None] * len(mermaid_codes)
+    cli_missing = False
     try:
-        with tempfile.NamedTemporaryFile(suffix=".mmd", delete=False) as f:
-            f.write(mermaid_code.encode("utf-8"))
-            mmd_path = f.name
-        out_path = mmd_path + ".png"
-        result = subprocess.run(
-            ["npx", "-y", "@mermaid-js/mermaid-cli", "-i", mmd_path, "-o", out_path],
-            capture_output=True,
-            timeout=30,
-            text=True,
-        )
-        Path(mmd_path).unlink(missing_ok=True)
-        if result.returncode == 0 and Path(out_path).exists():
-            data = Path(out_path).read_bytes()
-            Path(out_path).unlink(missing_ok=True)
-            return data
-    except (FileNotFoundError, subprocess.TimeoutExpired, Exception) as e:
-        logger.debug("Mermaid CLI not available or failed: %s", e)
-    return None
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            in_path = Path(tmp_dir) / "diagrams.md"
+            out_path = Path(tmp_dir) / "out.md"
+            in_path.write_text(
+                "".join(f"```mermaid\n{code}\n```\n\n" for code in mermaid_codes),
+                encoding="utf-8",
+            )
+            result = subprocess.run(
+                ["npx", "-y", "@mermaid-js/mermaid-cli", "-i", str(in_path), "-o", str(out_path), "-e", image_format],
+                capture_output=True,
+                timeout=30 + 5 * len(mermaid_codes),
+                text=True,
+            )
+            if result.returncode != 0:
+                logger.debug("Mermaid CLI batch run failed: %s", result.stderr[:500])
+            for i in range(len(mermaid_codes)):
+                image_path = Path(tmp_dir) / f"out-{i + 1}.{image_format}"
+                if image_path.exists():
+                    images[i] = image_path.read_bytes()
+    except FileNotFoundError as e:
+        # npx itself is missing; per-diagram retries would fail the same way
+        cli_missing = True
+        logger.debug("Mermaid CLI not available: %s", e)
+    except (subprocess.TimeoutExpired, Exception) as e:
+        logger.debug("Mermaid CLI batch run failed: %s", e)
+    if not cli_missing:
+        for i, code in enumerate(mermaid_codes):
+            if images[i] is None:
+                images[i] = _mermaid_to_image(code, image_format)
+    return images
 
 
 def _html_escape(s: str) -> str:
-    return (
-        s.replace("&", "&amp;")
-        .replace("<", "&lt;")
-        .replace(">", "&gt;")
-        .replace('"', "&quot;")
-    )
+    return s.translate(_HTML_ESCAPE_TABLE)
+
+
+def _anchor(title: str) -> str:
+    """Slug used as the HTML id for an artifact heading."""
+    return _ANCHOR_PATTERN.sub("-", title.strip()).strip("-").lower()
 
 
-def _markdown_to_text(content: str) -> str:
+def _markdown_to_html(content: str, cache: Optional[Dict[str, str]] = None) -> str:
+    """Render markdown to HTML; cache (one dict per export) lets PDF fallbacks reuse renderings."""
+    if cache is None:
+        return md_lib.markdown(content, extensions=["extra"])
+    rendered = cache.get(content)
+    if rendered is None:
+        rendered = cache[content] = md_lib.markdown(content, extensions=["extra"])
+    return rendered
+
+
+def _markdown_to_text(content: str, cache: Optional[Dict[str, str]] = None) -> str:
     """Convert markdown to plain text for reportlab fallback."""
-    html_fragment = md_lib.markdown(content, extensions=["extra"])
-    text = re.sub(r"<[^>]+>", "", html_fragment)
+    html_fragment = _markdown_to_html(content, cache)
+    text = _HTML_TAG_PATTERN.sub("", html_fragment)
     return html.unescape(text)
 
 
-def build_pdf_html(artifacts: List[Dict[str, Any]], analysis_id: str) -> str:
+def build_pdf_html(
+    artifacts: List[Dict[str, Any]],
+    analysis_id: str,
+    html_cache: Optional[Dict[str, str]] = None,
+) -> str:
     """Build HTML string for WeasyPrint: markdown -> HTML, Mermaid as image (if possible) + code block."""
     parts = [PDF_HTML_HEAD]
     parts.append('<div class="cover">')
-    parts.append(f"<h1>Documentation</h1>")
+    parts.append("<h1>Documentation</h1>")
     parts.append(f"<div class='subtle'>Analysis ID: {analysis_id}</div>")
     parts.append("</div>\n")
     if artifacts:
         parts.append("<div class='toc'><h2>Table of Contents</h2><ul>")
         for a in artifacts:
             title = a.get("title") or a.get("type", "Artifact")
-            anchor = re.sub(r"[^a-zA-Z0-9_-]+", "-", title.strip()).strip("-").lower()
+            anchor = _anchor(title)
             parts.append(f"<li><a href='#{_html_escape(anchor)}'>{_html_escape(title)}</a></li>")
         parts.append("</ul></div>")
+    # Render every diagram up front in a single mermaid-cli run
+    svg_images = iter(_mermaid_to_images(
+        [a.get("content", "") for a in artifacts if a.get("format", "markdown") == "mermaid"], "svg"
+    ))
     for a in artifacts:
         atype = a.get("type", "")
         title = a.get("title") or atype
         content = a.get("content", "")
         fmt = a.get("format", "markdown")
-        anchor = re.sub(r"[^a-zA-Z0-9_-]+", "-", title.strip()).strip("-").lower()
-        parts.append(f"<div class='page-break'></div>")
+        anchor = _anchor(title)
+        parts.append("<div class='page-break'></div>")
         parts.append(f"<h2 id='{_html_escape(anchor)}'>{_html_escape(title)}</h2>\n")
         if fmt == "mermaid":
-            svg_bytes = _mermaid_to_image_svg(content)
+            svg_bytes = next(svg_images)
             if svg_bytes:
-                b64 = base64.b64encode(svg_bytes).decode("ascii")
-                parts.append(f'<p><img src="data:image/svg+xml;base64,{b64}" alt="{_html_escape(title)}" /></p>\n')
-            parts.append(f'<pre class="mermaid-code"><code>{_html_escape(content)}</code></pre>\n')
+                # Large payloads go in as their own parts so they are copied only by the final join
+                parts.append('<p><img src="data:image/svg+xml;base64,')
+                parts.append(base64.b64encode(svg_bytes).decode("ascii"))
+                parts.append(f'" alt="{_html_escape(title)}" /></p>\n')
+            parts.append('<pre class="mermaid-code"><code>')
+            parts.append(_html_escape(content))
+            parts.append("</code></pre>\n")
         else:
-            html_fragment = md_lib.markdown(content, extensions=["extra"])
-            parts.append(html_fragment)
+            parts.append(_markdown_to_html(content, html_cache))
             parts.append("\n")
     parts.append(PDF_HTML_TAIL)
     return "".join(parts)
 
 
+def _get_browser():
+    """Return the shared Chromium browser, launching it on first use."""
+    global _PW_CTX, _PW_BROWSER
+    with _PW_LOCK:
+        if _PW_BROWSER is None or not _PW_BROWSER.is_connected():
+            from playwright.sync_api import sync_playwright
+            if _PW_CTX is None:
+                _PW_CTX = sync_playwright().start()
+            _PW_BROWSER = _PW_CTX.chromium.launch()
+        return _PW_BROWSER
+
+
+def _close_browser() -> None:
+    """Close the shared browser and stop Playwright."""
+    global _PW_CTX, _PW_BROWSER
+    with _PW_LOCK:
+        try:
+            if _PW_BROWSER is not None:
+                _PW_BROWSER.close()
+            if _PW_CTX is not None:
+                _PW_CTX.stop()
+        except Exception as exc:
+            logger.debug("Playwright shutdown failed: %s", exc)
+        _PW_BROWSER = None
+        _PW_CTX = None
+
+
+def _render_pdf_playwright(html_str: str) -> bytes:
+    """Print HTML to PDF in a fresh page of the shared browser."""
+    page = _get_browser().new_page()
+    try:
+        page.set_content(html_str, wait_until="networkidle")
+        return page.pdf(
+            format="A4",
+            print_background=True,
+            margin={"top": "20mm", "right": "18mm", "bottom": "20mm", "left": "18mm"},
+        )
+    finally:
+        page.close()
+
+
+def warm_pdf_browser() -> None:
+    """Launch the shared browser in the background so the first export is not delayed."""
+    def _warm():
+        try:
+            _get_browser()
+        except Exception as exc:
+            logger.info("Playwright warm-up skipped: %s", exc)
+    _PW_EXECUTOR.submit(_warm)
+
+
+def shutdown_pdf_browser() -> None:
+    """Close the shared browser (safe to call more than once)."""
+    if _PW_BROWSER is None and _PW_CTX is None:
+        return
+    try:
+        _PW_EXECUTOR.submit(_close_browser).result(timeout=10)
+    except Exception as exc:
+        logger.debug("Playwright shutdown failed: %s", exc)
+
+
 def build_pdf(artifacts: List[Dict[str, Any]], analysis_id: str) -> bytes:
     """Generate PDF bytes from artifacts. Prefer Playwright, then WeasyPrint, then reportlab."""
-    html_str = build_pdf_html(artifacts, analysis_id)
+    html_cache: Dict[str, str] = {}  # Markdown renderings shared by the renderers of this export only
+    html_str = build_pdf_html(artifacts, analysis_id, html_cache)
     try:
-        # Preferred renderer: Playwright (HTML/CSS)
-        from playwright.sync_api import sync_playwright
-        with sync_playwright() as p:
-            browser = p.chromium.launch()
-            page = browser.new_page()
-            page.set_content(html_str, wait_until="networkidle")
-            pdf_bytes = page.pdf(
-                format="A4",
-                print_background=True,
-                margin={"top": "20mm", "right": "18mm", "bottom": "20mm", "left": "18mm"},
-            )
-            browser.close()
-            return pdf_bytes
+        # Preferred renderer: Playwright (HTML/CSS), reusing one browser across exports
+        return _PW_EXECUTOR.submit(_render_pdf_playwright, html_str).result()
     except Exception as exc:
         logger.warning("Playwright unavailable, falling back to WeasyPrint: %s", exc)
     try:
@@ -188,10 +294,14 @@ def build_pdf(artifacts: List[Dict[str, Any]], analysis_id: str) -> bytes:
         return html_obj.write_pdf()
     except (OSError, ImportError) as exc:
         logger.warning("WeasyPrint unavailable, falling back to reportlab: %s", exc)
-        return _build_pdf_reportlab(artifacts, analysis_id)
+        return _build_pdf_reportlab(artifacts, analysis_id, html_cache)
 
 
-def _build_pdf_reportlab(artifacts: List[Dict[str, Any]], analysis_id: str) -> bytes:
+def _build_pdf_reportlab(
+    artifacts: List[Dict[str, Any]],
+    analysis_id: str,
+    html_cache: Optional[Dict[str, str]] = None,
+) -> bytes:
     """Fallback PDF generation using reportlab (plain text + optional Mermaid PNG)."""
     from io import BytesIO
     from reportlab.lib.pagesizes import LETTER
@@ -218,6 +328,10 @@ def _build_pdf_reportlab(artifacts: List[Dict[str, Any]], analysis_id: str) -> b
     draw_line(f"Documentation (Analysis {analysis_id[:8]})", size=14)
     y -= 6
 
+    png_images = iter(_mermaid_to_images(
+        [a.get("content", "") for a in artifacts if a.get("format", "markdown") == "mermaid"], "png"
+    ))
+
     for a in artifacts:
         title = a.get("title") or a.get("type", "Artifact")
         fmt = a.get("format", "markdown")
@@ -225,7 +339,7 @@ def _build_pdf_reportlab(artifacts: List[Dict[str, Any]], analysis_id: str) -> b
         draw_line(f"\n{title}", size=12)
 
         if fmt == "mermaid":
-            png_bytes = _mermaid_to_image_png(content)
+            png_bytes = next(png_images)
             if png_bytes:
                 img = ImageReader(BytesIO(png_bytes))
                 iw, ih = img.getSize()
@@ -241,7 +355,7 @@ def _build_pdf_reportlab(artifacts: List[Dict[str, Any]], analysis_id: str) -> b
             draw_line("Mermaid source:", size=10)
             draw_line(content, size=9)
         else:
-            draw_line(_markdown_to_text(content), size=10)
+            draw_line(_markdown_to_text(content, html_cache), size=10)
 
     c.showPage()
     c.save()
@@ -1,10 +1,25 @@
 """Langfuse helper utilities for LLM tracing."""
 from __future__ import annotations
-from typing import Any, Dict, Optional
+import atexit
+import queue
+import threading
+from typing import Any, Dict, List, Optional, Tuple
 from src.core.config import settings
+from src.core.logging_config import get_logger
 
+logger = get_logger(__name__)
 
-def _get_client():
+_MISSING = object()
+_CLIENT: Any = _MISSING
+_CLIENT_LOCK = threading.Lock()
+# Tracing is fire-and-forget: a daemon thread drains this queue in batches and
+# flushes once per batch, so no HTTP round-trip happens on the caller's path
+_QUEUE: "queue.Queue[Tuple[Any, ...]]" = queue.Queue(maxsize=10000)
+_BATCH_SIZE = 64
+_DROPPED = 0
+
+
+def _build_client():
     if not settings.LANGFUSE_PUBLIC_KEY or not settings.LANGFUSE_SECRET_KEY:
         return None
     try:
@@ -18,17 +33,31 @@ def _get_client():
         return None
 
 
-def log_generation(
+def _get_client():
+    """Return the process-wide Langfuse client (None when tracing is not configured)."""
+    global _CLIENT
+    if _CLIENT is _MISSING:
+        with _CLIENT_LOCK:
+            if _CLIENT is _MISSING:
+                client = _build_client()
+                if client is not None:
+                    threading.Thread(
+                        target=_drain_forever, args=(client,), name="langfuse", daemon=True
+                    ).start()
+                    atexit.register(_drain_pending, client)
+                _CLIENT = client
+    return _CLIENT
+
+
+def _send_generation(
+    client,
     name: str,
     model: str,
     input_data: Any,
     output_data: Any,
-    usage: Optional[Dict[str, Any]] = None,
-    metadata: Optional[Dict[str, Any]] = None
+    usage: Optional[Dict[str, Any]],
+    metadata: Optional[Dict[str, Any]],
 ) -> None:
-    client = _get_client()
-    if not client:
-        return
     try:
         trace = client.trace(name=name, metadata=metadata or {})
         generation = trace.generation(
@@ -40,3 +69,56 @@ def log_generation(
         generation.end(output=output_data, usage=usage or {})
     except Exception:
         pass
+
+
+def _emit(client, items: List[Tuple[Any, ...]]) -> None:
+    for item in items:
+        _send_generation(client, *item)
+    try:
+        client.flush()
+    except Exception:
+        pass
+
+
+def _take_batch(first: Tuple[Any, ...]) -> List[Tuple[Any, ...]]:
+    items = [first]
+    while len(items) < _BATCH_SIZE:
+        try:
+            items.append(_QUEUE.get_nowait())
+        except queue.Empty:
+            break
+    return items
+
+
+def _drain_forever(client) -> None:
+    while True:
+        _emit(client, _take_batch(_QUEUE.get()))
+
+
+def _drain_pending(client) -> None:
+    """Send whatever is still queued at interpreter exit."""
+    while True:
+        try:
+            first = _QUEUE.get_nowait()
+        except queue.Empty:
+            return
+        _emit(client, _take_batch(first))
+
+
+def log_generation(
+    name: str,
+    model: str,
+    input_data: Any,
+    output_data: Any,
+    usage: Optional[Dict[str, Any]] = None,
+    metadata: Optional[Dict[str, Any]] = None
+) -> None:
+    global _DROPPED
+    if not _get_client():
+        return
+    try:
+        _QUEUE.put_nowait((name, model, input_data, output_data, usage, metadata))
+    except queue.Full:
+        _DROPPED += 1
+        if _DROPPED == 1 or _DROPPED % 1000 == 0:
+            logger.warning("Langfuse queue full, dropped %d traces so far", _DROPPED)
@@ -1,39 +1,107 @@
 """MCP client helpers (FastMCP)."""
 from __future__ import annotations
 
-import json
-from typing import Any, Dict
+import asyncio
+from typing import Any, Dict, Optional
 
 from src.core.config import settings
+from src.core.json_utils import json_loads as _json_loads
+from src.core.loop_bound import LoopBound
+
+
+class _McpConnection:
+    """The shared client slot and the lock guarding it"""
+    
+    def __init__(self) -> None:
+        self.client: Optional[Any] = None
+        self.lock = asyncio.Lock()
+
+
+# One connected FastMCP client per process (bound to the loop that opened it), so each
+# search is a single RPC instead of a fresh handshake + session setup
+_mcp = LoopBound(_McpConnection)
+
+# Failures that mean the connection itself is unusable; tool and validation errors are not
+_CONNECTION_ERRORS: tuple = (OSError, EOFError, asyncio.TimeoutError)
+try:
+    import anyio
+    _CONNECTION_ERRORS += (anyio.ClosedResourceError, anyio.BrokenResourceError, anyio.EndOfStream)
+except ImportError:  # Installed with fastmcp; optional here
+    pass
+try:
+    import httpx
+    _CONNECTION_ERRORS += (httpx.TransportError,)
+except ImportError:  # Installed with fastmcp; optional here
+    pass
+
+
+def _search_fields(data: Dict[str, Any]) -> Dict[str, Any]:
+    results = data.get("results")
+    return {
+        "query": data.get("query", ""),
+        "results": results if isinstance(results, list) else [],
+        "message": data.get("message", ""),
+    }
 
 
 def _normalize_web_search_result(raw: Any) -> Dict[str, Any]:
     """Extract {query, results, message} from MCP tool result (may be CallToolResult or dict)."""
-    out: Dict[str, Any] = {"query": "", "results": [], "message": ""}
     if isinstance(raw, dict):
-        out["query"] = raw.get("query", "")
-        out["results"] = raw.get("results") if isinstance(raw.get("results"), list) else []
-        out["message"] = raw.get("message", "")
-        return out
+        return _search_fields(raw)
     # FastMCP may return CallToolResult with structured_content or content[].text
-    if hasattr(raw, "structured_content") and isinstance(raw.structured_content, dict):
-        out["query"] = raw.structured_content.get("query", "")
-        out["results"] = raw.structured_content.get("results") if isinstance(raw.structured_content.get("results"), list) else []
-        out["message"] = raw.structured_content.get("message", "")
-        return out
-    if hasattr(raw, "content") and isinstance(raw.content, list) and raw.content:
-        first = raw.content[0]
+    structured = getattr(raw, "structured_content", None)
+    if isinstance(structured, dict):
+        return _search_fields(structured)
+    content = getattr(raw, "content", None)
+    if isinstance(content, list) and content:
+        first = content[0]
         text = getattr(first, "text", None) or (first.get("text") if isinstance(first, dict) else None)
         if text and isinstance(text, str):
             try:
-                data = json.loads(text)
-                if isinstance(data, dict):
-                    out["query"] = data.get("query", "")
-                    out["results"] = data.get("results") if isinstance(data.get("results"), list) else []
-                    out["message"] = data.get("message", "")
-            except json.JSONDecodeError:
-                pass
-    return out
+                data = _json_loads(text)
+            except ValueError:
+                data = None
+            if isinstance(data, dict):
+                return _search_fields(data)
+    return {"query": "", "results": [], "message": ""}
+
+
+async def _get_mcp_client():
+    """Return the shared connected client, connecting on first use."""
+    conn = _mcp.get()
+    async with conn.lock:
+        if conn.client is None:
+            from fastmcp import Client
+            client = Client(settings.MCP_SERVER_URL)
+            await client.__aenter__()
+            conn.client = client
+        return conn.client
+
+
+async def close_mcp_client() -> None:
+    """Close the shared MCP connection (called on app shutdown)."""
+    conn = _mcp.current
+    if conn is None:
+        return
+    client, conn.client = conn.client, None
+    if client is not None:
+        try:
+            await client.__aexit__(None, None, None)
+        except Exception:
+            pass
+
+
+async def _discard_mcp_client(client: Any) -> None:
+    """Close the shared client after a connection failure, unless it was already replaced."""
+    conn = _mcp.get()
+    async with conn.lock:
+        if conn.client is not client:
+            return
+        conn.client = None
+    try:
+        await client.__aexit__(None, None, None)
+    except Exception:
+        pass
 
 
 async def call_mcp_web_search(query: str, limit: int = 5) -> Dict[str, Any] | None:
@@ -41,16 +109,20 @@ async def call_mcp_web_search(query: str, limit: int = 5) -> Dict[str, Any] | No
     if not settings.MCP_SERVER_URL:
         return None
     try:
-        from fastmcp import Client
+        client = await _get_mcp_client()
     except Exception:
         return None
 
     try:
-        async with Client(settings.MCP_SERVER_URL) as client:
-            result = await client.call_tool(
-                name="WebSearch",
-                arguments={"query": query, "limit": limit},
-            )
+        result = await client.call_tool(
+            name="WebSearch",
+            arguments={"query": query, "limit": limit},
+        )
         return _normalize_web_search_result(result)
-    except Exception:
+    except Exception as e:
+        # Only a broken connection is dropped (the next call reconnects); a failed tool
+        # call leaves the shared client to the other searches using it
+        is_connected = getattr(client, "is_connected", None)
+        if isinstance(e, _CONNECTION_ERRORS) or (callable(is_connected) and not is_connected()):
+            await _discard_mcp_client(client)
         return None
@@ -1,17 +1,20 @@
 """Project service - handles project creation and file validation"""
+import asyncio
 import os
 import shutil
 import zipfile
 import re
 import subprocess
-from pathlib import Path
-from typing import List, Dict, Any, Optional
+import tempfile
+import uuid
+from typing import BinaryIO, List, Dict, Any, Optional, Tuple
 from fastapi import UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from datetime import datetime
 from src.models.project import Project, SourceType, ProjectStatus
 from src.services.storage import storage_service
+from src.services.repository_analyzer import file_suffix, walk_files
 from src.core.config import settings
 from src.core.logging_config import get_logger
 from src.core.exceptions import (
@@ -25,6 +28,24 @@ from src.core.exceptions import (
 
 logger = get_logger(__name__)
 
+# Uploads are read in 1 MiB chunks and kept in memory up to 8 MiB before spilling to disk
+_UPLOAD_CHUNK_SIZE = 1 << 20
+_UPLOAD_SPOOL_MAX_MEMORY = 8 << 20
+
+# Extensions that make an extracted upload count as a code repository
+_CODE_FILE_EXTENSIONS = frozenset({
+    '.py', '.js', '.ts', '.java', '.cpp', '.c', '.h', '.cs', '.go', '.rs',
+    '.rb', '.php', '.swift', '.kt', '.scala', '.r', '.m', '.sh', '.sql',
+    '.html', '.css', '.jsx', '.tsx', '.vue', '.json', '.yaml', '.yml',
+    '.xml', '.toml', '.ini', '.cfg', '.conf'
+})
+# Common non-code directories skipped during that check
+_VALIDATION_SKIP_DIRS = frozenset({'.git', 'node_modules', '__pycache__', '.venv', 'venv', 'env', '.env'})
+
+# GitHub URL pattern - usernames: alphanumeric, hyphens, no dots;
+# repository: alphanumeric, hyphens, underscores, dots (GitHub names are ASCII-only)
+_GITHUB_URL_PATTERN = re.compile(r"https?://(www\.)?github\.com/[\w\-]+/[\w.\-]+(/.*)?", re.ASCII)
+
 
 class ProjectService:
     """Service for project operations"""
@@ -46,21 +67,23 @@ class ProjectService:
         
         stored_path = None
         try:
-            # Validate file
-            await self._validate_zip_file(file)
+            # Validate file (streams the upload once into a spooled temp file)
+            spool, on_disk = await self._validate_zip_file(file)
             logger.debug(f"ZIP file validation passed: {file.filename}")
             
-            # Read file content
-            content = await file.read()
-            logger.debug(f"Read {len(content)} bytes from ZIP file")
-            
             # Save uploaded file
-            stored_path = self.storage.save_upload(content, file.filename)
+            try:
+                stored_path = self.storage.save_upload(spool, file.filename, on_disk)
+            finally:
+                spool.close()
             logger.debug(f"Saved uploaded file to: {stored_path}")
             
+            # Allocate the project ID up front so the archive is extracted straight into
+            # its final projects/<id>/extracted directory (no move afterwards)
+            project_id = uuid.uuid4()
             try:
                 # Extract ZIP to project directory
-                extracted_path = self.storage.extract_zip(stored_path, owner_id)  # Temporary ID
+                extracted_path = self.storage.extract_zip(stored_path, project_id)
                 logger.debug(f"Extracted ZIP to: {extracted_path}")
                 
                 # Validate extracted content
@@ -69,6 +92,7 @@ class ProjectService:
                 
                 # Create project record
                 project = Project(
+                    id=project_id,
                     name=name,
                     owner_id=owner_id,
                     source_type=SourceType.ZIP,
@@ -78,41 +102,20 @@ class ProjectService:
                     config=config or {}
                 )
                 
+                # Every column has a client-side default, so after commit (expire_on_commit=False)
+                # the instance is complete without a refresh SELECT
                 self.db.add(project)
                 await self.db.commit()
-                await self.db.refresh(project)
-                
-                # Move extracted files to final project directory
-                temp_extract = self.storage.get_file_path(extracted_path)
-                final_extract = self.storage.projects_path / str(project.id) / "extracted"
-                
-                if not temp_extract.exists():
-                    logger.warning(f"Temporary extracted path does not exist: {temp_extract}")
-                    # This might be OK if extraction was already done, but log it
-                
-                if temp_extract.exists():
-                    final_extract.parent.mkdir(parents=True, exist_ok=True)
-                    # Use shutil.move() instead of rename() for cross-directory moves on Windows
-                    shutil.move(str(temp_extract), str(final_extract))
-                    logger.debug(f"Moved extracted files from {temp_extract} to {final_extract}")
-                    
-                    # Verify move was successful
-                    if not final_extract.exists():
-                        raise IOError(f"Failed to move extracted files to {final_extract}")
-                
-                # Verify final extracted path exists
-                if not final_extract.exists():
-                    raise IOError(f"Extracted files not found at {final_extract}. Extraction may have failed.")
                 
                 logger.info(f"Project created: {project.id}")
                 return project
                 
             except Exception as e:
-                # If extraction or validation fails, clean up uploaded file
+                # If extraction or validation fails, clean up uploaded file and extracted tree
                 logger.error(f"ZIP extraction/validation failed, cleaning up: {stored_path}", exc_info=True)
                 try:
-                    if stored_path and self.storage.file_exists(stored_path):
-                        os.remove(self.storage.get_file_path(stored_path))
+                    self.storage.delete_project_files(project_id)
+                    if stored_path and self.storage.delete_file(stored_path):
                         logger.debug(f"Cleaned up uploaded file: {stored_path}")
                 except Exception as cleanup_error:
                     logger.error(f"Error cleaning up file: {cleanup_error}", exc_info=True)
@@ -156,7 +159,6 @@ class ProjectService:
             
             self.db.add(project)
             await self.db.commit()
-            await self.db.refresh(project)
             
             logger.info(f"Project created: {project.name} (ID: {project.id})")
             return project
@@ -184,23 +186,21 @@ class ProjectService:
             # Remove if already exists (in case of retry)
             if target_dir.exists():
                 logger.debug(f"Removing existing directory: {target_dir}")
-                shutil.rmtree(target_dir)
+                await asyncio.to_thread(shutil.rmtree, target_dir)
             
             # Create parent directory
             target_dir.parent.mkdir(parents=True, exist_ok=True)
             
-            # Clone the repository using git
+            # Clone the repository using git, without blocking the event loop
             logger.debug(f"Running git clone to {target_dir}")
             try:
-                result = subprocess.run(
-                    ["git", "clone", "--depth", "1", github_url, str(target_dir)],
-                    capture_output=True,
-                    text=True,
-                    timeout=300  # 5 minute timeout
+                returncode, stdout, stderr = await self._run_git(
+                    ["git", "clone", "--depth", "1", "--single-branch", "--no-tags", github_url, str(target_dir)],
+                    timeout=300,  # 5 minute timeout
                 )
                 
-                if result.returncode != 0:
-                    error_msg = result.stderr or result.stdout
+                if returncode != 0:
+                    error_msg = stderr or stdout
                     logger.error(f"Git clone failed: {error_msg}")
                     raise GitHubAccessException(f"Failed to clone repository: {error_msg}")
                     
@@ -209,7 +209,7 @@ class ProjectService:
                 raise GitHubAccessException(
                     "Git is required to clone repositories. Please install Git and ensure it's in your PATH."
                 )
-            except subprocess.TimeoutExpired:
+            except (asyncio.TimeoutError, subprocess.TimeoutExpired):
                 logger.error("Git clone timed out after 5 minutes")
                 raise GitHubAccessException("Repository cloning timed out. Repository may be too large.")
             
@@ -217,12 +217,13 @@ class ProjectService:
             if not target_dir.exists():
                 raise GitHubAccessException("Repository clone failed - directory not created")
             
-            # Count files to verify something was cloned
-            file_count = len(list(target_dir.rglob("*")))
-            if file_count == 0:
+            # Verify something besides git metadata was cloned (top level only, no full listing)
+            with os.scandir(target_dir) as entries:
+                top_level = [entry.name for entry in entries if entry.name != ".git"]
+            if not top_level:
                 raise GitHubAccessException("Repository appears to be empty")
             
-            logger.debug(f"Cloned repository with {file_count} files")
+            logger.debug(f"Cloned repository with {len(top_level)} top-level entries")
             
             # Return relative path for storage
             relative_path = f"projects/{str(project_id)}/extracted"
@@ -234,8 +235,41 @@ class ProjectService:
             logger.error(f"Error cloning GitHub repository: {e}", exc_info=True)
             raise GitHubAccessException(f"Failed to clone repository: {str(e)}")
     
-    async def _validate_zip_file(self, file: UploadFile):
-        """Validate uploaded ZIP file"""
+    @staticmethod
+    async def _run_git(args: List[str], timeout: float) -> Tuple[int, str, str]:
+        """Run a git command as an asyncio subprocess; returns (returncode, stdout, stderr)"""
+        # Fail immediately on private/missing repos instead of waiting for a credential prompt
+        env = {**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+        try:
+            proc = await asyncio.create_subprocess_exec(
+                *args,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                env=env,
+            )
+        except NotImplementedError:
+            # Event loops without subprocess support (e.g. the Windows selector loop)
+            result = await asyncio.to_thread(
+                subprocess.run, args, capture_output=True, text=True, timeout=timeout, env=env
+            )
+            return result.returncode, result.stdout, result.stderr
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(), timeout=timeout)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            raise
+        return (
+            proc.returncode,
+            stdout.decode("utf-8", errors="replace"),
+            stderr.decode("utf-8", errors="replace"),
+        )
+    
+    async def _validate_zip_file(self, file: UploadFile) -> Tuple[BinaryIO, bool]:
+        """Validate uploaded ZIP file and return its content as a file positioned at 0.
+        
+        The flag tells whether the spooled file has rolled over to disk.
+        """
         logger.debug(f"Validating ZIP file: {file.filename}")
         
         # Check file extension
@@ -250,37 +284,43 @@ class ProjectService:
                 f"Unsupported file type. Only ZIP files are supported. Got: {file.filename}"
             )
         
-        # Check file size
-        content = await file.read()
-        file_size_mb = len(content) / (1024 * 1024)
-        logger.debug(f"ZIP file size: {file_size_mb:.2f} MB")
-        
-        if file_size_mb > settings.MAX_ZIP_SIZE_MB:
-            logger.warning(f"ZIP validation failed: File too large - {file_size_mb:.2f} MB > {settings.MAX_ZIP_SIZE_MB} MB")
-            raise FileTooLargeException(
-                f"File size ({file_size_mb:.2f} MB) exceeds maximum allowed size "
-                f"({settings.MAX_ZIP_SIZE_MB} MB)"
-            )
-        
-        # Reset file pointer for later use
-        await file.seek(0)
-        
-        # Validate ZIP structure
+        # Stream the upload once, enforcing the size limit as bytes arrive
+        max_bytes = settings.MAX_ZIP_SIZE_MB * 1024 * 1024
+        spool = tempfile.SpooledTemporaryFile(max_size=_UPLOAD_SPOOL_MAX_MEMORY)
+        total = 0
         try:
-            # Read into memory for validation
-            await file.seek(0)
-            content = await file.read()
-            await file.seek(0)
+            while chunk := await file.read(_UPLOAD_CHUNK_SIZE):
+                total += len(chunk)
+                if total > max_bytes:
+                    logger.warning(f"ZIP validation failed: File too large - more than {settings.MAX_ZIP_SIZE_MB} MB")
+                    raise FileTooLargeException(
+                        f"File size exceeds maximum allowed size ({settings.MAX_ZIP_SIZE_MB} MB)"
+                    )
+                spool.write(chunk)
+            logger.debug(f"ZIP file size: {total / (1024 * 1024):.2f} MB")
+            spool.seek(0)
             
-            # Try to open as ZIP
-            import io
-            zip_file = zipfile.ZipFile(io.BytesIO(content), 'r')
-            zip_file.testzip()  # Test for corruption
-            zip_file.close()
-        except zipfile.BadZipFile:
-            raise CorruptedFileException("File is not a valid ZIP archive or is corrupted")
-        except Exception as e:
-            raise CorruptedFileException(f"Error reading ZIP file: {str(e)}")
+            # Validate ZIP structure from the central directory; member data is checked
+            # during extraction unless a full CRC pass is requested
+            try:
+                with zipfile.ZipFile(spool, 'r') as zip_file:
+                    entries = zip_file.infolist()
+                    if settings.VALIDATE_ZIP_CRC:
+                        bad_member = zip_file.testzip()
+                        if bad_member is not None:
+                            raise zipfile.BadZipFile(f"Bad CRC for {bad_member}")
+            except zipfile.BadZipFile:
+                raise CorruptedFileException("File is not a valid ZIP archive or is corrupted")
+            except Exception as e:
+                raise CorruptedFileException(f"Error reading ZIP file: {str(e)}")
+            if not entries:
+                raise EmptyRepositoryException("ZIP archive is empty")
+            spool.seek(0)
+            # SpooledTemporaryFile moves to disk once its size exceeds max_size
+            return spool, total > _UPLOAD_SPOOL_MAX_MEMORY
+        except BaseException:
+            spool.close()
+            raise
     
     def _validate_extracted_repository(self, extracted_path: str):
         """Validate that extracted repository contains code"""
@@ -291,44 +331,21 @@ class ProjectService:
             logger.error(f"Repository validation failed: Extracted directory does not exist - {extracted_path}")
             raise EmptyRepositoryException("Extracted directory does not exist")
         
-        # Look for common code file patterns
-        code_extensions = {
-            '.py', '.js', '.ts', '.java', '.cpp', '.c', '.h', '.cs', '.go', '.rs',
-            '.rb', '.php', '.swift', '.kt', '.scala', '.r', '.m', '.sh', '.sql',
-            '.html', '.css', '.jsx', '.tsx', '.vue', '.json', '.yaml', '.yml',
-            '.xml', '.toml', '.ini', '.cfg', '.conf'
-        }
-        
-        # Skip common non-code directories
-        skip_dirs = {'.git', 'node_modules', '__pycache__', '.venv', 'venv', 'env', '.env'}
-        
-        code_files_found = []
-        
-        for root, dirs, files in os.walk(extract_dir):
-            # Filter out skip directories
-            dirs[:] = [d for d in dirs if d not in skip_dirs]
-            
-            for file in files:
-                file_path = Path(root) / file
-                if file_path.suffix.lower() in code_extensions:
-                    code_files_found.append(str(file_path.relative_to(extract_dir)))
-        
-        logger.debug(f"Found {len(code_files_found)} code files in repository")
+        # The walk stops at the first recognizable code file
+        for entry in walk_files(str(extract_dir), _VALIDATION_SKIP_DIRS):
+            if file_suffix(entry.name) in _CODE_FILE_EXTENSIONS:
+                logger.debug(f"Found code file in repository: {entry.name}")
+                return
         
-        if not code_files_found:
-            logger.warning("Repository validation failed: No recognizable code files found")
-            raise EmptyRepositoryException(
-                "Repository contains no recognizable code files. "
-                "Please ensure the ZIP contains source code files."
-            )
+        logger.warning("Repository validation failed: No recognizable code files found")
+        raise EmptyRepositoryException(
+            "Repository contains no recognizable code files. "
+            "Please ensure the ZIP contains source code files."
+        )
     
     def _validate_github_url(self, url: str) -> bool:
         """Validate GitHub URL format"""
-        # GitHub URL pattern - better validation
-        # Usernames: alphanumeric, hyphens, no dots
-        # Repository: alphanumeric, hyphens, underscores, dots
-        pattern = r'^https?://(www\.)?github\.com/[\w\-]+/[\w\.\-]+(/.*)?$'
-        is_valid = bool(re.match(pattern, url))
+        is_valid = bool(_GITHUB_URL_PATTERN.fullmatch(url))
         
         if not is_valid:
             logger.warning(f"Invalid GitHub URL format: {url}")
@@ -1,13 +1,76 @@
 """Repository analyzer service - detects repo type, structure, and metadata"""
+import fnmatch
+import mmap
 import os
-import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
 from pathlib import Path
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, Iterator, List, Any, Optional, Set, Tuple
+from src.core.json_utils import json_loads as _json_loads
 from src.core.logging_config import get_logger
 
 logger = get_logger(__name__)
 
 
+def file_suffix(name: str) -> str:
+    """Lower-cased extension of a file name, matching Path(name).suffix.lower()"""
+    i = name.rfind(".")
+    return name[i:].lower() if 0 < i < len(name) - 1 else ""
+
+
+def _framework_hits(path: str, pattern_bytes: Dict[str, List[bytes]]) -> Set[str]:
+    """Frameworks whose patterns occur in the file, searched with mmap.find (memmem)"""
+    hits = set()
+    try:
+        with open(path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return hits
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for framework, patterns in pattern_bytes.items():
+                    if any(mm.find(pattern) != -1 for pattern in patterns):
+                        hits.add(framework)
+    except (OSError, ValueError):
+        pass
+    return hits
+
+
+def glob_union(patterns) -> re.Pattern:
+    """One regex matching a name against any of the shell-style patterns (use .match)"""
+    return re.compile("|".join(fnmatch.translate(pattern) for pattern in patterns))
+
+
+def walk_files(root: str, skip_dirs, skip_glob: Optional[re.Pattern] = None) -> Iterator[os.DirEntry]:
+    """Yield file entries under root in os.walk top-down order, pruning skip_dirs by name
+    (and names matching skip_glob, for wildcard entries like "*.egg-info").
+    
+    Works on os.scandir entries directly, so no Path objects or extra stat calls per file.
+    """
+    stack = [root]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                entries = list(it)
+        except OSError:
+            continue
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if not is_dir:
+                yield entry
+            elif (
+                entry.name not in skip_dirs
+                and not (skip_glob and skip_glob.match(entry.name))
+                and not entry.is_symlink()
+            ):
+                subdirs.append(entry.path)
+        # Reversed so the first subdirectory is walked next, as os.walk does
+        stack.extend(reversed(subdirs))
+
+
 class RepositoryAnalyzer:
     """Analyzes repository structure and detects type, frameworks, entry points"""
     
@@ -127,10 +190,50 @@ class RepositoryAnalyzer:
         "documentation": ["README.md", "CONTRIBUTING.md", "docs/"],
     }
     
+    # Classification sets for _count_files_by_type
+    CODE_EXTENSIONS = {
+        ".py", ".js", ".ts", ".jsx", ".tsx", ".java", ".go", ".rs", ".cs", ".php",
+        ".rb", ".cpp", ".c", ".h", ".swift", ".kt", ".scala", ".r", ".m",
+    }
+    # Substring test for "test_", "_test.py", ".test.js", ".test.ts", ".test.jsx", ".test.tsx"
+    TEST_FILE_PATTERN = re.compile(r"test_|_test\.py|\.test\.(?:js|ts)")
+    CONFIG_EXTENSIONS = {".json", ".yaml", ".yml", ".toml", ".ini", ".cfg", ".xml"}
+    DOC_EXTENSIONS = {".md", ".rst", ".txt"}
+    
+    # Per-file dispatch tables: one dict lookup instead of a chain of set probes
+    EXTENSION_CATEGORY = {
+        **dict.fromkeys(DOC_EXTENSIONS, "documentation"),
+        **dict.fromkeys(CONFIG_EXTENSIONS, "config"),
+        **dict.fromkeys(CODE_EXTENSIONS, "code"),
+    }
+    # Key files are shell-style patterns ("*.csproj"); the union prefilters, the per-type
+    # patterns decide which repository types a hit belongs to
+    KEY_FILE_PATTERN = glob_union(
+        pattern for indicators in REPO_INDICATORS.values() for pattern in indicators["key_files"]
+    )
+    KEY_FILE_PATTERNS = {
+        repo_type: glob_union(indicators["key_files"])
+        for repo_type, indicators in REPO_INDICATORS.items()
+    }
+    FRAMEWORK_SCAN_WORKERS = 4
+    CONFIG_FILE_NAMES = frozenset(IMPORTANT_FILES["config_files"])
+    ENTRY_POINT_NAMES = frozenset(os.path.basename(path) for path in IMPORTANT_FILES["entry_points"])
+    EXTENSION_REPO_TYPE = {
+        ext: repo_type
+        for repo_type, indicators in REPO_INDICATORS.items()
+        for ext in indicators["extensions"]
+    }
+    
     def __init__(self, repo_path: str):
         """Initialize repository analyzer"""
         self.repo_path = Path(repo_path)
         self.skip_patterns = self.DEFAULT_SKIP_PATTERNS
+        wildcard_skips = [p for p in self.skip_patterns if any(c in p for c in "*?[")]
+        self._skip_glob = glob_union(wildcard_skips) if wildcard_skips else None
+    
+    def iter_files(self, root: Optional[str] = None) -> Iterator[os.DirEntry]:
+        """File entries under root (default: the repository) with this analyzer's skip rules applied"""
+        return walk_files(root or str(self.repo_path), self.skip_patterns, self._skip_glob)
     
     def analyze(self) -> Dict[str, Any]:
         """Analyze repository and return metadata"""
@@ -176,21 +279,73 @@ class RepositoryAnalyzer:
             logger.error(f"Error analyzing repository: {e}", exc_info=True)
             raise
     
+    @cached_property
+    def _walk_index(self) -> Dict[str, Any]:
+        """Walk the repository once (per analyzer) and collect what the detection helpers need"""
+        file_count_by_type: Dict[str, int] = {}
+        stats = {
+            "total": 0,
+            "code": 0,
+            "test": 0,
+            "config": 0,
+            "documentation": 0,
+        }
+        important = {
+            "config_files": [],
+            "documentation_files": [],
+        }
+        key_files: Dict[str, List[str]] = {repo_type: [] for repo_type in self.REPO_INDICATORS}
+        entry_candidates = set()
+        entry_point_names = self.ENTRY_POINT_NAMES
+        config_names = self.CONFIG_FILE_NAMES
+        key_file = self.KEY_FILE_PATTERN.match
+        
+        root_prefix_len = len(os.path.join(str(self.repo_path), ""))
+        extension_repo_type = self.EXTENSION_REPO_TYPE
+        extension_category = self.EXTENSION_CATEGORY
+        test_file = self.TEST_FILE_PATTERN.search
+        
+        for entry in self.iter_files():
+            file = entry.name
+            ext = file_suffix(file)
+            relative_path = entry.path[root_prefix_len:]
+            
+            # Repository type and key files per language
+            ext_repo_type = extension_repo_type.get(ext)
+            if ext_repo_type is not None:
+                file_count_by_type[ext_repo_type] = file_count_by_type.get(ext_repo_type, 0) + 1
+            if key_file(file):
+                for repo_type, pattern in self.KEY_FILE_PATTERNS.items():
+                    if pattern.match(file):
+                        key_files[repo_type].append(entry.path)
+            
+            # File categories
+            stats["total"] += 1
+            category = "test" if test_file(file) else extension_category.get(ext)
+            if category is not None:
+                stats[category] += 1
+            
+            # Important files
+            if file in config_names or relative_path in config_names:
+                important["config_files"].append(relative_path)
+            if file.endswith(".md") or file.startswith("README"):
+                important["documentation_files"].append(relative_path)
+            if file in entry_point_names:
+                entry_candidates.add(relative_path.replace(os.sep, "/"))
+        
+        return {
+            "file_count_by_type": file_count_by_type,
+            "stats": stats,
+            "important": important,
+            "key_files": key_files,
+            "entry_candidates": entry_candidates,
+        }
+    
     def _detect_repository_type(self) -> str:
         """Detect primary repository type"""
         logger.debug(f"Detecting repository type from: {self.repo_path}")
         
-        file_count_by_type = {}
-        
-        for root, dirs, files in os.walk(self.repo_path):
-            # Filter skip directories
-            dirs[:] = [d for d in dirs if d not in self.skip_patterns]
-            
-            for file in files:
-                for repo_type, indicators in self.REPO_INDICATORS.items():
-                    ext = Path(file).suffix.lower()
-                    if ext in indicators["extensions"]:
-                        file_count_by_type[repo_type] = file_count_by_type.get(repo_type, 0) + 1
+        file_count_by_type = self._walk_index["file_count_by_type"]
         
         if not file_count_by_type:
             logger.warning("Could not detect repository type, defaulting to unknown")
@@ -202,43 +357,7 @@ class RepositoryAnalyzer:
     
     def _count_files_by_type(self) -> Dict[str, int]:
         """Count files by type (code, test, config, documentation)"""
-        logger.debug("Counting files by type")
-        
-        stats = {
-            "total": 0,
-            "code": 0,
-            "test": 0,
-            "config": 0,
-            "documentation": 0,
-        }
-        
-        code_extensions = {
-            ".py", ".js", ".ts", ".jsx", ".tsx", ".java", ".go", ".rs", ".cs", ".php",
-            ".rb", ".cpp", ".c", ".h", ".swift", ".kt", ".scala", ".r", ".m",
-        }
-        
-        test_patterns = ["test_", "_test.py", ".test.js", ".test.ts", ".test.jsx", ".test.tsx"]
-        config_extensions = {".json", ".yaml", ".yml", ".toml", ".ini", ".cfg", ".xml"}
-        doc_extensions = {".md", ".rst", ".txt"}
-        
-        for root, dirs, files in os.walk(self.repo_path):
-            dirs[:] = [d for d in dirs if d not in self.skip_patterns]
-            
-            for file in files:
-                stats["total"] += 1
-                ext = Path(file).suffix.lower()
-                
-                # Check if test file
-                is_test = any(test_pattern in file for test_pattern in test_patterns)
-                if is_test:
-                    stats["test"] += 1
-                elif ext in code_extensions:
-                    stats["code"] += 1
-                elif ext in config_extensions:
-                    stats["config"] += 1
-                elif ext in doc_extensions:
-                    stats["documentation"] += 1
-        
+        stats = dict(self._walk_index["stats"])
         logger.debug(f"File counts: {stats}")
         return stats
     
@@ -247,40 +366,19 @@ class RepositoryAnalyzer:
         logger.debug("Finding entry points")
         
         entry_points = {}
+        entry_candidates = self._walk_index["entry_candidates"]
         
         for entry_point in self.IMPORTANT_FILES["entry_points"]:
-            full_path = self.repo_path / entry_point
-            if full_path.exists():
-                entry_points[entry_point] = str(full_path.relative_to(self.repo_path))
+            if entry_point in entry_candidates:
+                entry_points[entry_point] = str(Path(entry_point))
                 logger.debug(f"Found entry point: {entry_point}")
         
         return entry_points
     
     def _find_important_files(self) -> Dict[str, List[str]]:
         """Find important configuration files"""
-        logger.debug("Finding important files")
-        
-        important = {
-            "config_files": [],
-            "documentation_files": [],
-        }
-        
-        for root, dirs, files in os.walk(self.repo_path):
-            dirs[:] = [d for d in dirs if d not in self.skip_patterns]
-            
-            for file in files:
-                file_path = Path(root) / file
-                relative_path = str(file_path.relative_to(self.repo_path))
-                
-                # Check if config file
-                if any(cf in self.IMPORTANT_FILES["config_files"] for cf in [file, relative_path]):
-                    important["config_files"].append(relative_path)
-                
-                # Check if documentation
-                if file.endswith(".md") or file.startswith("README"):
-                    important["documentation_files"].append(relative_path)
-        
-        return important
+        important = self._walk_index["important"]
+        return {name: list(paths) for name, paths in important.items()}
     
     def _detect_frameworks(self, repo_type: str) -> Dict[str, Any]:
         """Detect frameworks used in the repository"""
@@ -294,41 +392,34 @@ class RepositoryAnalyzer:
         if repo_type not in self.REPO_INDICATORS:
             return frameworks
         
-        indicators = self.REPO_INDICATORS[repo_type]
-        detected_frameworks = {}
-        
-        # Check key files for framework mentions
-        key_files = self._find_key_files(indicators["key_files"])
-        
-        for framework, patterns in indicators["frameworks"].items():
-            for key_file in key_files:
-                try:
-                    with open(key_file, "r", encoding="utf-8", errors="ignore") as f:
-                        content = f.read()
-                        if any(pattern in content for pattern in patterns):
-                            detected_frameworks[framework] = True
-                except Exception:
-                    pass
-        
+        framework_patterns = self.REPO_INDICATORS[repo_type]["frameworks"]
+        pattern_bytes = {
+            framework: [pattern.encode("utf-8") for pattern in patterns]
+            for framework, patterns in framework_patterns.items()
+        }
+        key_files = self._find_key_files(repo_type)
+        
+        # Check key files for framework mentions (a few threads when there are many files)
+        found = set()
+        if len(key_files) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.FRAMEWORK_SCAN_WORKERS, len(key_files))) as executor:
+                for hits in executor.map(lambda path: _framework_hits(path, pattern_bytes), key_files):
+                    found |= hits
+        elif key_files:
+            found = _framework_hits(key_files[0], pattern_bytes)
+        
+        # Report in the indicator table's order
+        detected_frameworks = [framework for framework in framework_patterns if framework in found]
         if detected_frameworks:
-            frameworks["primary"] = list(detected_frameworks.keys())[0]
-            frameworks["secondary"] = list(detected_frameworks.keys())[1:]
+            frameworks["primary"] = detected_frameworks[0]
+            frameworks["secondary"] = detected_frameworks[1:]
         
         logger.debug(f"Detected frameworks: {frameworks}")
         return frameworks
     
-    def _find_key_files(self, key_file_patterns: List[str]) -> List[str]:
-        """Find key configuration files"""
-        found_files = []
-        
-        for root, dirs, files in os.walk(self.repo_path):
-            dirs[:] = [d for d in dirs if d not in self.skip_patterns]
-            
-            for file in files:
-                if any(pattern in file for pattern in key_file_patterns):
-                    found_files.append(os.path.join(root, file))
-        
-        return found_files
+    def _find_key_files(self, repo_type: str) -> List[str]:
+        """Find key configuration files for a repository type"""
+        return list(self._walk_index["key_files"].get(repo_type, []))
     
     def _extract_dependencies(self, repo_type: str) -> Dict[str, Any]:
         """Extract framework and library dependencies"""
@@ -354,7 +445,9 @@ class RepositoryAnalyzer:
         if req_file.exists():
             try:
                 with open(req_file, "r") as f:
-                    dependencies["requirements"] = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+                    dependencies["requirements"] = [
+                        stripped for line in f if not line.startswith("#") and (stripped := line.strip())
+                    ]
             except Exception:
                 pass
         
@@ -379,10 +472,9 @@ class RepositoryAnalyzer:
         package_file = self.repo_path / "package.json"
         if package_file.exists():
             try:
-                with open(package_file, "r") as f:
-                    package_data = json.load(f)
-                    dependencies["dependencies"] = package_data.get("dependencies", {})
-                    dependencies["devDependencies"] = package_data.get("devDependencies", {})
+                package_data = _json_loads(package_file.read_bytes())
+                dependencies["dependencies"] = package_data.get("dependencies", {})
+                dependencies["devDependencies"] = package_data.get("devDependencies", {})
             except Exception:
                 pass
         
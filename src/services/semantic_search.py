@@ -1,11 +1,16 @@
 """Semantic search and Q&A service for code analysis"""
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func
-from typing import List, Dict, Any, Optional
+from sqlalchemy import select, func, text, cast
+from pgvector.sqlalchemy import BIT
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Set, Tuple
 from uuid import UUID
+import asyncio
+import hashlib
 import logging
-import numpy as np
+import time
 
+from src.core.loop_bound import LoopBound
 from src.models.code_chunk import CodeChunk
 from src.services.code_parser import CodeParser
 from src.services.langfuse_client import log_generation
@@ -13,9 +18,159 @@ from src.services.usage_tracker import record_llm_usage
 
 logger = logging.getLogger(__name__)
 
+_QUERY_EMBEDDING_MODEL = "text-embedding-3-small"
+_QUERY_CACHE_SIZE = 1024
+_QUERY_CACHE_TTL_SECONDS = 3600.0
+# Query embeddings by normalized-query hash -> (expires_at, vector), least recently used first
+_query_embeddings: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+
+
+def _query_cache_key(query: str) -> str:
+    """Hash of the model and whitespace-normalized query"""
+    normalized = " ".join(query.split())
+    return hashlib.sha256(f"{_QUERY_EMBEDDING_MODEL}\0{normalized}".encode()).hexdigest()
+
+
+def _cached_query_embedding(key: str) -> Optional[List[float]]:
+    """Return a live cached embedding and mark it recently used"""
+    entry = _query_embeddings.get(key)
+    if entry is None:
+        return None
+    if entry[0] < time.monotonic():
+        del _query_embeddings[key]
+        return None
+    _query_embeddings.move_to_end(key)
+    return entry[1]
+
+
+def _remember_query_embedding(key: str, vector: List[float]) -> None:
+    """Cache an embedding, evicting the least recently used beyond _QUERY_CACHE_SIZE"""
+    _query_embeddings[key] = (time.monotonic() + _QUERY_CACHE_TTL_SECONDS, vector)
+    _query_embeddings.move_to_end(key)
+    while len(_query_embeddings) > _QUERY_CACHE_SIZE:
+        _query_embeddings.popitem(last=False)
+
+
+# pgvector >= 0.8 can keep walking the HNSW graph until enough rows pass the project filter
+_HNSW_ITERATIVE_SCAN_MIN_VERSION = (0, 8)
+_hnsw_iterative_scan: Optional[bool] = None
+
+
+def _embedding_bits(embedding):
+    """binary_quantize() as bit(n); matches the expression of the code_chunks bit HNSW index"""
+    return cast(func.binary_quantize(embedding), BIT(CodeChunk.embedding.type.dim))
+
+
+def _extension_version(version: Optional[str]) -> Tuple[int, ...]:
+    if not version:
+        return ()
+    return tuple(int(part) for part in version.split(".")[:2] if part.isdigit())
+
+
+class _QueryEmbeddingBatcher:
+    """Coalesces concurrent query embeddings into one API call (bound to one event loop)"""
+    
+    WINDOW_SECONDS = 0.01  # How long the first query waits for others to join its batch
+    MAX_BATCH = 64
+    
+    def __init__(self, client: Any):
+        self._client = client
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._window: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()  # Strong refs so in-flight sends are not collected
+    
+    async def embed(self, query: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((query, future))
+        if len(self._pending) >= self.MAX_BATCH:
+            batch, self._pending = self._pending, []
+            self._track(loop.create_task(self._send(batch)))
+        elif self._window is None:
+            self._window = self._track(loop.create_task(self._flush_after_window()))
+        return await future
+    
+    def _track(self, task: asyncio.Task) -> asyncio.Task:
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+    
+    async def _flush_after_window(self) -> None:
+        await asyncio.sleep(self.WINDOW_SECONDS)
+        self._window = None
+        batch, self._pending = self._pending, []
+        if batch:
+            await self._send(batch)
+    
+    async def _embed(self, texts: List[str]) -> Dict[str, List[float]]:
+        response = await self._client.embeddings.create(input=texts, model=_QUERY_EMBEDDING_MODEL)
+        vectors = {text: item.embedding for text, item in zip(texts, response.data)}
+        if len(vectors) != len(texts):
+            raise ValueError(f"Embedding response has {len(response.data)} vectors for {len(texts)} inputs")
+        return vectors
+    
+    async def _send(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        from openai import BadRequestError
+        texts = list(dict.fromkeys(query for query, _ in batch))  # Identical queries are sent once
+        try:
+            try:
+                results: Dict[str, Any] = await self._embed(texts)
+            except BadRequestError:
+                if len(texts) == 1:
+                    raise
+                # One bad input (e.g. an over-long query) rejects the whole call: retry each
+                # query alone so only its own callers see the error
+                outcomes = await asyncio.gather(*(self._embed([text]) for text in texts), return_exceptions=True)
+                results = {
+                    text: outcome if isinstance(outcome, BaseException) else outcome[text]
+                    for text, outcome in zip(texts, outcomes)
+                }
+            for query, future in batch:
+                if future.done():
+                    continue
+                outcome = results[query]
+                if isinstance(outcome, BaseException):
+                    future.set_exception(outcome)
+                else:
+                    future.set_result(outcome)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            # Never leave a caller waiting, e.g. if the send itself was cancelled
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(RuntimeError("Query embedding batch did not complete"))
+
+
+def _new_openai_client() -> Tuple[Any, _QueryEmbeddingBatcher]:
+    from src.core.config import settings
+    from openai import AsyncOpenAI
+    client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+    return client, _QueryEmbeddingBatcher(client)
+
+
+# OpenAI client and query batcher shared by all searches on the current event loop,
+# so the client's connection pool is kept between requests
+_openai = LoopBound(_new_openai_client)
+
+
+def _get_openai_client() -> Any:
+    """Return the AsyncOpenAI client for the running event loop"""
+    return _openai.get()[0]
+
+
+def _get_query_batcher() -> _QueryEmbeddingBatcher:
+    """Return the query embedding batcher for the running event loop"""
+    return _openai.get()[1]
+
+
 class SemanticSearchService:
     """Service for semantic search over code using embeddings"""
     
+    BULK_LLM_CONCURRENCY = 8  # Concurrent answer generations in answer_questions_bulk
+    
     def __init__(self, db: AsyncSession):
         self.db = db
         self.parser = CodeParser()
@@ -30,57 +185,87 @@ class SemanticSearchService:
         """
         Find code chunks similar to a query using semantic search with pgvector.
         """
+        logger.debug(f"Semantic search for query in project: {project_id}")
+        
+        # Generate embedding for the query
+        query_embedding = await self._generate_query_embedding(query)
+        
+        if not query_embedding:
+            logger.warning(f"Failed to generate embedding for query: '{query}'")
+            return []
+        
+        return await self._search_by_embedding(project_id, query_embedding, limit, similarity_threshold)
+    
+    async def _search_by_embedding(
+        self,
+        project_id: str,
+        query_embedding: List[float],
+        limit: int,
+        similarity_threshold: float
+    ) -> List[Dict[str, Any]]:
+        """Rank the project's chunks by inner product with an already computed query embedding"""
+        from src.core.config import settings
+        
         try:
-            logger.debug(f"Semantic search for query in project: {project_id}")
-            
-            # Generate embedding for the query
-            query_embedding = await self._generate_query_embedding(query)
-            
-            if not query_embedding:
-                logger.warning(f"Failed to generate embedding for query: '{query}'")
-                return []
+            await self._tune_hnsw_scan()
             
             # NOTE: Do NOT wrap query_embedding in Vector(). Pass the list of floats directly.
             # max_inner_product correlates to the <#> operator.
             # In pgvector, <#> returns the negative inner product.
             # Sorting ASC (default) puts the most similar (most negative) at the top.
-            stmt = (
-                select(
-                    CodeChunk,
-                    CodeChunk.embedding.max_inner_product(query_embedding).label('distance')
-                )
-                .where(
-                    CodeChunk.project_id == project_id,
-                    CodeChunk.embedding.isnot(None)
+            # The distance is computed once in the inner query (ORDER BY reuses the label); the
+            # LIMITed subquery is not flattened, so the outer threshold filter and re-sort (iterative
+            # index scans may return rows slightly out of order) read the computed column.
+            distance = CodeChunk.embedding.max_inner_product(query_embedding).label('distance')
+            in_project = (
+                CodeChunk.project_id == project_id,
+                CodeChunk.embedding.isnot(None)
+            )
+            # Plain columns (no embedding, no ORM objects): rows come back as lightweight tuples
+            nearest = select(
+                CodeChunk.id, CodeChunk.name, CodeChunk.chunk_type, CodeChunk.language,
+                CodeChunk.file_path, CodeChunk.content, CodeChunk.docstring,
+                CodeChunk.start_line, CodeChunk.end_line, distance
+            ).where(*in_project)
+            if settings.VECTOR_SEARCH_BINARY_RERANK:
+                # First stage: Hamming distance over 1-bit quantized vectors (192 bytes instead of
+                # 3KB each) through their own HNSW index; only the shortlist is scored exactly
+                query_bits = _embedding_bits(cast(query_embedding, CodeChunk.embedding.type))
+                shortlist = (
+                    select(CodeChunk.id)
+                    .where(*in_project)
+                    .order_by(_embedding_bits(CodeChunk.embedding).hamming_distance(query_bits))
+                    .limit(max(settings.VECTOR_SEARCH_RERANK_CANDIDATES, limit))
+                    .subquery()
                 )
-                .order_by(CodeChunk.embedding.max_inner_product(query_embedding))
-                .limit(limit)
+                nearest = nearest.join(shortlist, CodeChunk.id == shortlist.c.id)
+            nearest = nearest.order_by(distance).limit(limit).subquery()
+            # distance is -(a · b). Since OpenAI vectors are normalized, 
+            # similarity (cosine) = (a · b). So similarity >= threshold means distance <= -threshold.
+            stmt = (
+                select(nearest)
+                .where(nearest.c.distance <= -similarity_threshold)
+                .order_by(nearest.c.distance)
             )
             
             result = await self.db.execute(stmt)
-            rows = result.all()
             
             results = []
-            for chunk, distance in rows:
-                # distance is -(a · b). Since OpenAI vectors are normalized, 
-                # similarity (cosine) = (a · b). So similarity = -distance.
-                similarity = -float(distance)
-                
-                # Only include results above similarity threshold
-                if similarity >= similarity_threshold:
-                    results.append({
-                        "id": str(chunk.id),
-                        "name": chunk.name,
-                        "type": chunk.chunk_type,
-                        "language": chunk.language,
-                        "file_path": chunk.file_path,
-                        "content": chunk.content,
-                        "docstring": chunk.docstring,
-                        "start_line": chunk.start_line,
-                        "end_line": chunk.end_line,
-                        "similarity_score": round(similarity, 4),
-                        "confidence": "high" if similarity > 0.8 else "medium"
-                    })
+            for chunk in result.all():
+                similarity = -float(chunk.distance)
+                results.append({
+                    "id": str(chunk.id),
+                    "name": chunk.name,
+                    "type": chunk.chunk_type,
+                    "language": chunk.language,
+                    "file_path": chunk.file_path,
+                    "content": chunk.content,
+                    "docstring": chunk.docstring,
+                    "start_line": chunk.start_line,
+                    "end_line": chunk.end_line,
+                    "similarity_score": round(similarity, 4),
+                    "confidence": "high" if similarity > 0.8 else "medium"
+                })
             
             logger.debug(f"Found {len(results)} chunks above threshold {similarity_threshold}")
             return results
@@ -89,21 +274,36 @@ class SemanticSearchService:
             logger.error(f"Error during semantic search: {e}", exc_info=True)
             return []
     
+    async def _tune_hnsw_scan(self) -> None:
+        """Set HNSW search parameters for the current transaction (one round-trip)"""
+        global _hnsw_iterative_scan
+        from src.core.config import settings
+        
+        if _hnsw_iterative_scan is None:
+            version = await self.db.scalar(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'"))
+            _hnsw_iterative_scan = _extension_version(version) >= _HNSW_ITERATIVE_SCAN_MIN_VERSION
+        settings_sql = "SELECT set_config('hnsw.ef_search', :ef_search, true)"
+        if _hnsw_iterative_scan:
+            settings_sql += ", set_config('hnsw.iterative_scan', 'relaxed_order', true)"
+        await self.db.execute(text(settings_sql), {"ef_search": str(settings.VECTOR_SEARCH_EF_SEARCH)})
+    
     async def _generate_query_embedding(self, query: str) -> Optional[List[float]]:
-        """Generate embedding using OpenAI text-embedding-3-small"""
+        """Generate embedding using OpenAI text-embedding-3-small (repeated queries are served from cache)"""
         try:
             from src.core.config import settings
-            from openai import AsyncOpenAI
             
             if not settings.OPENAI_API_KEY:
                 return None
             
-            client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-            response = await client.embeddings.create(
-                input=query,
-                model="text-embedding-3-small"
-            )
-            return response.data[0].embedding
+            key = _query_cache_key(query)
+            cached = _cached_query_embedding(key)
+            if cached is not None:
+                return cached
+            
+            # Concurrent queries share a single embeddings request
+            embedding = await _get_query_batcher().embed(query)
+            _remember_query_embedding(key, embedding)
+            return embedding
         except Exception as e:
             logger.error(f"Error generating query embedding: {e}")
             return None
@@ -128,60 +328,111 @@ class SemanticSearchService:
                 limit=5,
                 similarity_threshold=0.25,
             )
-
-            citations = [
-                {
-                    "file_path": c.get("file_path", ""),
-                    "start_line": c.get("start_line"),
-                    "end_line": c.get("end_line"),
-                    "content": c.get("content", ""),
-                    "relevance_score": c.get("similarity_score", 0),
-                    "language": c.get("language"),
-                }
-                for c in relevant_chunks
-            ]
-
-            if not relevant_chunks:
-                return {
-                    "question": question,
-                    "answer": "No relevant code found for this question.",
-                    "citations": [],
-                    "results": [],
-                    "total_results": 0,
-                    "message": "No relevant code found",
-                }
-            answer_text = ""
-            if use_llm:
-                answer_text = await self._generate_answer_from_chunks(
-                    question,
-                    relevant_chunks,
-                    project_id=project_id,
-                    progress=progress,
-                    analysis_id=analysis_id,
-                )
-            if not answer_text:
-                answer_text = (
-                    f"Found {len(relevant_chunks)} relevant code section(s). "
-                    "See citations below for file locations and snippets."
-                )
-            return {
-                "question": question,
-                "answer": answer_text,
-                "citations": citations,
-                "results": relevant_chunks,
-                "total_results": len(relevant_chunks),
-                "message": f"Found {len(relevant_chunks)} relevant code sections",
-            }
+            return await self._answer_from_chunks(
+                project_id, question, relevant_chunks, use_llm, progress, analysis_id
+            )
         except Exception as e:
             logger.error(f"Error searching for question: {e}")
+            return self._error_answer(question)
+    
+    async def answer_questions_bulk(
+        self,
+        project_id: str,
+        questions: List[str],
+        use_llm: bool = True,
+    ) -> List[Dict[str, Any]]:
+        """
+        Answer several independent questions, in order.
+        
+        Query embeddings and LLM answers run concurrently (embeddings share one API call);
+        the vector searches run one after another because they share this service's session.
+        """
+        embeddings = await asyncio.gather(*(self._generate_query_embedding(q) for q in questions))
+        
+        searches: List[List[Dict[str, Any]]] = []
+        for question, embedding in zip(questions, embeddings):
+            if not embedding:
+                logger.warning(f"Failed to generate embedding for query: '{question}'")
+                searches.append([])
+            else:
+                searches.append(await self._search_by_embedding(project_id, embedding, 5, 0.25))
+        
+        semaphore = asyncio.Semaphore(self.BULK_LLM_CONCURRENCY)
+        
+        async def answer(question: str, relevant_chunks: List[Dict[str, Any]]) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    return await self._answer_from_chunks(project_id, question, relevant_chunks, use_llm)
+                except Exception as e:
+                    logger.error(f"Error searching for question: {e}")
+                    return self._error_answer(question)
+        
+        return list(await asyncio.gather(*(answer(q, chunks) for q, chunks in zip(questions, searches))))
+    
+    async def _answer_from_chunks(
+        self,
+        project_id: str,
+        question: str,
+        relevant_chunks: List[Dict[str, Any]],
+        use_llm: bool,
+        progress: Optional[Any] = None,
+        analysis_id: Optional[UUID] = None,
+    ) -> Dict[str, Any]:
+        """Build the structured answer for a question from its retrieved chunks"""
+        citations = [
+            {
+                "file_path": c.get("file_path", ""),
+                "start_line": c.get("start_line"),
+                "end_line": c.get("end_line"),
+                "content": c.get("content", ""),
+                "relevance_score": c.get("similarity_score", 0),
+                "language": c.get("language"),
+            }
+            for c in relevant_chunks
+        ]
+
+        if not relevant_chunks:
             return {
                 "question": question,
-                "answer": "An error occurred while answering.",
+                "answer": "No relevant code found for this question.",
                 "citations": [],
                 "results": [],
                 "total_results": 0,
-                "message": "Error processing search",
+                "message": "No relevant code found",
             }
+        answer_text = ""
+        if use_llm:
+            answer_text = await self._generate_answer_from_chunks(
+                question,
+                relevant_chunks,
+                project_id=project_id,
+                progress=progress,
+                analysis_id=analysis_id,
+            )
+        if not answer_text:
+            answer_text = (
+                f"Found {len(relevant_chunks)} relevant code section(s). "
+                "See citations below for file locations and snippets."
+            )
+        return {
+            "question": question,
+            "answer": answer_text,
+            "citations": citations,
+            "results": relevant_chunks,
+            "total_results": len(relevant_chunks),
+            "message": f"Found {len(relevant_chunks)} relevant code sections",
+        }
+    
+    @staticmethod
+    def _error_answer(question: str) -> Dict[str, Any]:
+        return {
+            "question": question,
+            "answer": "An error occurred while answering.",
+            "citations": [],
+            "results": [],
+            "total_results": 0,
+            "message": "Error processing search",
+        }
 
     async def _generate_answer_from_chunks(
         self,
@@ -194,7 +445,6 @@ class SemanticSearchService:
         """Generate a short answer from question and code chunks using LLM. Returns empty string if unavailable."""
         try:
             from src.core.config import settings
-            from openai import AsyncOpenAI
             if not getattr(settings, "OPENAI_API_KEY", None):
                 return ""
             context = self._prepare_context(chunks)
@@ -204,7 +454,7 @@ class SemanticSearchService:
                 "If the snippets do not contain enough information, say so briefly."
             )
             user = f"Question: {question}\n\nRelevant code:\n{context}"
-            client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+            client = _get_openai_client()
             model = getattr(settings, "OPENAI_MODEL", "gpt-4o-mini") or "gpt-4o-mini"
             response = await client.chat.completions.create(
                 model=model,
@@ -242,10 +492,10 @@ class SemanticSearchService:
             return ""
 
     def _prepare_context(self, chunks: List[Dict[str, Any]]) -> str:
-        ctx = ""
-        for i, c in enumerate(chunks):
-            ctx += f"\n--- Chunk {i+1} ({c['name']}) ---\n{c['content'][:500]}\n"
-        return ctx
+        return "".join(
+            f"\n--- Chunk {i+1} ({c['name']}) ---\n{c['content'][:500]}\n"
+            for i, c in enumerate(chunks)
+        )
 
     def _calculate_confidence(self, chunks: List[Dict[str, Any]]) -> str:
         if not chunks: return "low"
@@ -1,16 +1,79 @@
 """File storage service - abstracted for easy cloud migration"""
+import io
 import os
 import shutil
+import threading
 import uuid
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import BinaryIO, Optional
+from typing import BinaryIO, Optional, Union
 from src.core.config import settings
 from src.core.logging_config import get_logger
 from src.core.exceptions import InvalidFileException, CorruptedFileException
 
 logger = get_logger(__name__)
 
+_COPY_BUFFER_SIZE = 1 << 20
+# Archives smaller than this (uncompressed) are extracted serially; threads don't pay off
+_PARALLEL_EXTRACT_MIN_BYTES = 8 << 20
+
+
+def _copy_file(src: BinaryIO, dst: BinaryIO, on_disk: bool = False) -> None:
+    """Copy src (from its current position) into dst.
+    
+    When the caller knows src is backed by a real file (on_disk), the copy runs
+    kernel-side via sendfile. Otherwise fileno() is not touched: on an in-memory
+    spooled file it would force the buffer out to disk first.
+    """
+    if on_disk and hasattr(os, "sendfile"):
+        try:
+            src_fd = src.fileno()
+            src.flush()
+            dst.flush()
+            offset = src.tell()
+            end = os.fstat(src_fd).st_size
+            while offset < end:
+                sent = os.sendfile(dst.fileno(), src_fd, offset, end - offset)
+                if sent == 0:
+                    break
+                offset += sent
+            src.seek(offset)
+            return
+        except (OSError, io.UnsupportedOperation):
+            # sendfile can't target regular files on some platforms (e.g. macOS)
+            dst.seek(0)
+            dst.truncate()
+    shutil.copyfileobj(src, dst, _COPY_BUFFER_SIZE)
+
+
+def _extract_members_parallel(zip_file_path: Path, infos, extract_dir: Path, workers: int) -> None:
+    """Extract members on a thread pool (zlib releases the GIL), one ZipFile handle per thread"""
+    local = threading.local()
+    handles = []
+    handles_lock = threading.Lock()
+    
+    def extract_one(info: zipfile.ZipInfo) -> None:
+        zf = getattr(local, "zip_file", None)
+        if zf is None:
+            zf = local.zip_file = zipfile.ZipFile(zip_file_path, 'r')
+            with handles_lock:
+                handles.append(zf)
+        try:
+            zf.extract(info, extract_dir)
+        except FileExistsError:
+            # Another thread created the same parent directory first; the retry finds it
+            zf.extract(info, extract_dir)
+    
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Largest members first so the pool stays balanced
+            ordered = sorted(infos, key=lambda info: info.file_size, reverse=True)
+            list(executor.map(extract_one, ordered))
+    finally:
+        for handle in handles:
+            handle.close()
+
 
 class StorageService:
     """Storage service with local implementation, designed for easy cloud migration"""
@@ -19,13 +82,18 @@ class StorageService:
         self.base_path = Path(base_path or settings.STORAGE_PATH)
         self.projects_path = self.base_path / "projects"
         self.uploads_path = self.base_path / "uploads"
+        self.cache_path = self.base_path / "cache"
         
         # Ensure directories exist
         self.projects_path.mkdir(parents=True, exist_ok=True)
         self.uploads_path.mkdir(parents=True, exist_ok=True)
+        self.cache_path.mkdir(parents=True, exist_ok=True)
     
-    def save_upload(self, file_content: bytes, filename: str) -> str:
-        """Save uploaded file and return relative path"""
+    def save_upload(self, file_content: Union[bytes, BinaryIO], filename: str, on_disk: bool = False) -> str:
+        """Save uploaded file (bytes or a readable file object) and return relative path.
+        
+        on_disk marks a file object backed by a real file, which is copied with sendfile.
+        """
         try:
             file_ext = Path(filename).suffix
             unique_filename = f"{uuid.uuid4()}{file_ext}"
@@ -35,9 +103,13 @@ class StorageService:
             
             # Write file
             with open(file_path, "wb") as f:
-                f.write(file_content)
+                if isinstance(file_content, bytes):
+                    f.write(file_content)
+                else:
+                    _copy_file(file_content, f, on_disk)
+                size = f.tell()
             
-            logger.debug(f"File saved: {unique_filename} ({len(file_content)} bytes)")
+            logger.debug(f"File saved: {unique_filename} ({size} bytes)")
             # Return relative path for storage in DB
             return str(file_path.relative_to(self.base_path))
             
@@ -70,6 +142,26 @@ class StorageService:
             logger.error(f"Unexpected error while saving project file: {e}", exc_info=True)
             raise
     
+    def save_artifact(self, project_id: str, filename: str, content: str) -> str:
+        """Save a large analysis artifact under the project and return relative path"""
+        try:
+            artifacts_dir = self.projects_path / str(project_id) / "artifacts"
+            artifacts_dir.mkdir(parents=True, exist_ok=True)
+            
+            file_path = artifacts_dir / filename
+            file_path.write_text(content, encoding="utf-8")
+            
+            logger.debug(f"Artifact saved: {file_path}")
+            return str(file_path.relative_to(self.base_path))
+            
+        except IOError as e:
+            logger.error(f"I/O error while saving artifact: {e}", exc_info=True)
+            raise InvalidFileException(f"Failed to save artifact: {str(e)}")
+    
+    def read_artifact(self, relative_path: str) -> str:
+        """Read an artifact saved with save_artifact"""
+        return self.get_file_path(relative_path).read_text(encoding="utf-8")
+    
     def get_file_path(self, relative_path: str) -> Path:
         """Get absolute path from relative path"""
         return self.base_path / relative_path
@@ -89,7 +181,13 @@ class StorageService:
             extract_dir.mkdir(parents=True, exist_ok=True)
             
             with zipfile.ZipFile(zip_file_path, 'r') as zip_ref:
-                zip_ref.extractall(extract_dir)
+                infos = zip_ref.infolist()
+                workers = min(os.cpu_count() or 1, len(infos))
+                parallel = workers > 1 and sum(info.file_size for info in infos) >= _PARALLEL_EXTRACT_MIN_BYTES
+                if not parallel:
+                    zip_ref.extractall(extract_dir)
+            if parallel:
+                _extract_members_parallel(zip_file_path, infos, extract_dir, workers)
             
             logger.debug(f"ZIP extraction successful: {extract_dir}")
             return str(extract_dir.relative_to(self.base_path))
@@ -106,9 +204,18 @@ class StorageService:
     
     def delete_project_files(self, project_id: int):
         """Delete all files for a project"""
-        project_dir = self.projects_path / str(project_id)
-        if project_dir.exists():
-            shutil.rmtree(project_dir)
+        try:
+            shutil.rmtree(self.projects_path / str(project_id))
+        except FileNotFoundError:
+            pass
+    
+    def delete_file(self, relative_path: str) -> bool:
+        """Delete a stored file; returns False if it did not exist"""
+        try:
+            os.unlink(self.get_file_path(relative_path))
+        except FileNotFoundError:
+            return False
+        return True
     
     def file_exists(self, relative_path: str) -> bool:
         """Check if file exists"""
@@ -51,20 +51,13 @@ async def record_llm_usage(
     completion_tokens: int,
     model: str,
 ) -> None:
-    """Accumulate tokens and cost for this analysis and call progress.update_progress."""
+    """Add this call's tokens and cost to the analysis (single atomic UPDATE) and notify the UI."""
     if prompt_tokens <= 0 and completion_tokens <= 0:
         return
-    analysis = await progress.get_analysis(analysis_id)
-    if not analysis:
-        return
-    current_tokens = getattr(analysis, "total_tokens_used", None) or 0
-    current_cost = float(getattr(analysis, "estimated_cost", None) or 0.0)
-    new_tokens = prompt_tokens + completion_tokens
-    cost_delta = compute_cost(prompt_tokens, completion_tokens, model)
-    await progress.update_progress(
+    await progress.add_usage(
         analysis_id,
-        tokens_used=current_tokens + new_tokens,
-        estimated_cost=round(current_cost + cost_delta, 6),
+        prompt_tokens + completion_tokens,
+        compute_cost(prompt_tokens, completion_tokens, model),
     )
 
 
@@ -74,17 +67,7 @@ async def record_embedding_usage(
     total_tokens: int,
     model: str,
 ) -> None:
-    """Accumulate embedding tokens and cost for this analysis and call progress.update_progress."""
+    """Add embedding tokens and cost to the analysis (single atomic UPDATE) and notify the UI."""
     if total_tokens <= 0:
         return
-    analysis = await progress.get_analysis(analysis_id)
-    if not analysis:
-        return
-    current_tokens = getattr(analysis, "total_tokens_used", None) or 0
-    current_cost = float(getattr(analysis, "estimated_cost", None) or 0.0)
-    cost_delta = compute_embedding_cost(total_tokens, model)
-    await progress.update_progress(
-        analysis_id,
-        tokens_used=current_tokens + total_tokens,
-        estimated_cost=round(current_cost + cost_delta, 6),
-    )
+    await progress.add_usage(analysis_id, total_tokens, compute_embedding_cost(total_tokens, model))